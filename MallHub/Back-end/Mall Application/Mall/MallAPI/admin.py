@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Store, Product, User, Section
+from .models import Category, Store, Product, User, Section, OutboxEvent
 # Import Loyalty Models
 from .models.Loyalty_models import Diamond, UserPoints, Prize, PrizeRedemption, GlobalLoyaltySetting
 
@@ -73,4 +73,12 @@ class PrizeRedemptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'prize', 'redeemed_at', 'status', 'discount_code', 'used')
     list_filter = ('status', 'prize__store', 'used')
     search_fields = ('user__email', 'prize__name', 'discount_code')
-    readonly_fields = ('user', 'prize', 'redeemed_at', 'discount_code') # Usually managed by system
\ No newline at end of file
+    readonly_fields = ('user', 'prize', 'redeemed_at', 'discount_code') # Usually managed by system
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'key', 'status', 'attempts', 'available_at', 'processed_at')
+    list_filter = ('event_type', 'status')
+    search_fields = ('key', 'last_error')
+    readonly_fields = ('event_type', 'key', 'payload', 'attempts', 'last_error', 'locked_by', 'locked_at',
+                       'processed_at', 'created_at') # Managed by the process_outbox worker
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MallapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'MallAPI'
+
+    def ready(self):
+        # Register cache invalidation signal handlers
+        from MallAPI import signals
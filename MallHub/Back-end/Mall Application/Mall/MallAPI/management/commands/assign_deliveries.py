@@ -1,29 +1,66 @@
+import time
 from django.core.management.base import BaseCommand
-from MallAPI.models.payment_model import Payment
+from MallAPI.services.delivery_assignment_services import DeliveryAssignmentEngine
 from MallAPI.services.delivery_services import DeliveryService
 
 class Command(BaseCommand):
     help = 'Assign deliveries for completed payments that have no delivery orders'
 
-    def handle(self, *args, **options):
-        # Get completed payments with no delivery orders
-        payments = Payment.objects.filter(
-            status='completed'
-        ).exclude(
-            deliveryorder__isnull=False
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Payments assigned per insert')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the assignments and report them without writing anything'
+        )
+        parser.add_argument(
+            '--rebalance',
+            action='store_true',
+            help='Spread pending delivery orders evenly across active delivery users first'
         )
 
-        for payment in payments:
-            try:
-                delivery = DeliveryService.assign_delivery(payment.id)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Successfully created delivery order {delivery.id} for payment {payment.payment_id}'
-                    )
-                )
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'Failed to create delivery for payment {payment.payment_id}: {str(e)}'
-                    )
-                ) 
\ No newline at end of file
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        if options['rebalance']:
+            if dry_run:
+                self.stdout.write('Skipping rebalance in dry run')
+            else:
+                moved = DeliveryAssignmentEngine.rebalance()
+                self.stdout.write(self.style.SUCCESS(f'Rebalanced {moved} pending delivery orders'))
+
+        # Workloads are read once and tracked in memory for the whole run
+        engine = DeliveryAssignmentEngine.load()
+        if not engine.loads:
+            self.stdout.write(self.style.ERROR('No delivery users available'))
+            return
+
+        started = time.monotonic()
+        seen = created = batches = 0
+        chunk = []
+        payment_ids = DeliveryService.get_unassigned_payment_ids()
+        for payment_id in payment_ids.iterator(chunk_size=batch_size):
+            chunk.append(payment_id)
+            if len(chunk) >= batch_size:
+                created += len(DeliveryService.bulk_create_delivery_orders(chunk, engine, dry_run=dry_run))
+                seen += len(chunk)
+                batches += 1
+                self.stdout.write(f'Batch {batches}: {created}/{seen} payments assigned')
+                chunk = []
+        if chunk:
+            created += len(DeliveryService.bulk_create_delivery_orders(chunk, engine, dry_run=dry_run))
+            seen += len(chunk)
+            batches += 1
+
+        elapsed = time.monotonic() - started
+        rate = created / elapsed if elapsed > 0 else 0
+        verb = 'Would create' if dry_run else 'Created'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {created} delivery orders for {seen} payments in {batches} batches '
+                f'({elapsed:.2f}s, {rate:.0f} orders/s); {seen - created} already assigned'
+            )
+        )
+        for courier_id, load in sorted(engine.loads.items()):
+            self.stdout.write(f'Delivery user {courier_id}: {load} open orders')
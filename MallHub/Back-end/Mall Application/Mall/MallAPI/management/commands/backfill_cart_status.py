@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from MallAPI.models.cart_model import ShoppingCart
+
+class Command(BaseCommand):
+    help = 'Backfill ShoppingCart.status for carts created before the active cart state existed'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Carts that were paid for are checked out
+            checked_out = ShoppingCart.objects.filter(
+                payment__isnull=False
+            ).exclude(
+                status=ShoppingCart.CHECKED_OUT
+            ).update(status=ShoppingCart.CHECKED_OUT)
+
+            # Previously the active cart was the user's newest cart, so any
+            # other unpaid cart was unreachable
+            newest_cart = ShoppingCart.objects.filter(
+                user=OuterRef('user')
+            ).order_by('-created_at', '-id').values('id')[:1]
+
+            abandoned_ids = list(
+                ShoppingCart.objects.filter(
+                    status=ShoppingCart.ACTIVE
+                ).annotate(
+                    newest_id=Subquery(newest_cart)
+                ).exclude(
+                    id=F('newest_id')
+                ).values_list('id', flat=True)
+            )
+            abandoned = ShoppingCart.objects.filter(
+                id__in=abandoned_ids
+            ).update(status=ShoppingCart.ABANDONED)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Marked {checked_out} carts as checked out and {abandoned} carts as abandoned'
+            )
+        )
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from MallAPI.services.outbox_services import OutboxService
+
+class Command(BaseCommand):
+    help = 'Run outbox events (delivery assignment, loyalty points) recorded by committed payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Events processed in parallel')
+        parser.add_argument('--batch-size', type=int, default=50, help='Events claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no event is due')
+        parser.add_argument('--once', action='store_true', help='Process the due events and exit instead of polling')
+        parser.add_argument('--requeue-failed', action='store_true', help='Retry events that exhausted their attempts first')
+
+    def handle(self, *args, **options):
+        if options['requeue_failed']:
+            requeued = OutboxService.requeue_failed()
+            self.stdout.write(f'Requeued {requeued} failed events')
+
+        worker_id = OutboxService.get_worker_id()
+        claimed_total = completed_total = 0
+        with OutboxService.create_executor(options['workers']) as executor:
+            try:
+                while True:
+                    claimed, completed = OutboxService.run_once(executor, worker_id, options['batch_size'])
+                    claimed_total += claimed
+                    completed_total += completed
+                    if claimed < options['batch_size']:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping outbox worker')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {claimed_total} outbox events: {completed_total} completed, '
+                f'{claimed_total - completed_total} failed or deferred'
+            )
+        )
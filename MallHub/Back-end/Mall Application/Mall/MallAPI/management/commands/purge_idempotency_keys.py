@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from MallAPI.services.idempotency_services import IdempotencyService
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than their retention period'
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyService.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency records'))
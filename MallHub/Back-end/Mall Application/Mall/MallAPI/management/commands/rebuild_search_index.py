@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from MallAPI.services.search_index_services import SearchIndexService
+
+class Command(BaseCommand):
+    help = 'Rebuild the product, store and category search index from scratch'
+
+    def handle(self, *args, **options):
+        counts = SearchIndexService.rebuild()
+        for entity_type, indexed in counts.items():
+            self.stdout.write(
+                self.style.SUCCESS(f'Indexed {indexed} {entity_type} records')
+            )
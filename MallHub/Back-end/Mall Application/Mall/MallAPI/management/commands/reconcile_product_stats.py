@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from MallAPI.services.product_stats_services import ProductStatsService
+
+class Command(BaseCommand):
+    help = 'Recompute product stats rows from ratings, interactions, comments and favorites, fixing any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products checked per batch')
+
+    def handle(self, *args, **options):
+        checked, created, updated = ProductStatsService.reconcile(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Checked {checked} products: created {created} missing stats rows, corrected {updated} drifted rows'
+            )
+        )
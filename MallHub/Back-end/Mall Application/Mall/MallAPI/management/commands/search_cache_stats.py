@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from MallAPI.services.store_services import SearchService
+
+class Command(BaseCommand):
+    help = 'Show SearchService cache hit/miss counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        for query_type, stats in SearchService.get_cache_stats().items():
+            hit_rate = 'n/a' if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}"
+            self.stdout.write(
+                f"{query_type}: {stats['hits']} hits, {stats['misses']} misses, hit rate {hit_rate}"
+            )
+
+        if options['reset']:
+            SearchService.reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Search cache counters reset'))
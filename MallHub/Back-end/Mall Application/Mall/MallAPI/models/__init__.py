@@ -5,3 +5,6 @@ from .cart_model import ShoppingCart, CartItem
 from .payment_model import Payment
 from .delivery_model import DeliveryOrder
 from .Loyalty_models import Diamond, UserPoints, Prize, PrizeRedemption
+from .search_model import SearchIndexEntry
+from .outbox_model import OutboxEvent
+from .idempotency_model import IdempotencyRecord
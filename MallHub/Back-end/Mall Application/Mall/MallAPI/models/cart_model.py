@@ -1,12 +1,40 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import Case, Value, When
 from .store_model import Product
 
 class ShoppingCart(models.Model):
+    ACTIVE = 'active'
+    CHECKED_OUT = 'checked_out'
+    ABANDONED = 'abandoned'
+
+    STATUS_CHOICES = [
+        (ACTIVE, 'Active'),
+        (CHECKED_OUT, 'Checked out'),
+        (ABANDONED, 'Abandoned'),
+    ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Only one cart per user is ACTIVE; it moves to CHECKED_OUT when paid for
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status', '-created_at'], name='cart_user_status_idx'),
+        ]
+        constraints = [
+            # At most one ACTIVE cart per user. Spelled as an expression
+            # (NULL for other statuses, and NULLs never collide) because MySQL
+            # ignores UniqueConstraint(condition=...)
+            models.UniqueConstraint(
+                'user',
+                Case(When(status='active', then=Value(1))),
+                name='cart_one_active_per_user',
+            ),
+        ]
+
     def __str__(self):
         return f"Cart for {self.user.email}"
 
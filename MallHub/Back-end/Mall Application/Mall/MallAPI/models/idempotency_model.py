@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+class IdempotencyRecord(models.Model):
+    """Outcome of a POST made with an Idempotency-Key header, replayed to
+    retries of the same request instead of executing it again"""
+    IN_PROGRESS = 'in_progress'
+    COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETED, 'Completed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_records')
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    # Hash of the request body, so a key reused for a different request is rejected
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=IN_PROGRESS)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the running request claimed the key; stale claims can be taken over
+    claimed_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'endpoint', 'key')
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} - {self.status}"
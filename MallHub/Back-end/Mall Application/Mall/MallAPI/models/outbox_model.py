@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+
+class OutboxEvent(models.Model):
+    """Side effect recorded in the same transaction as the change that
+    caused it, and carried out later by the process_outbox worker"""
+    ASSIGN_DELIVERY = 'assign_delivery'
+    ACCRUE_POINTS = 'accrue_points'
+    EVENT_TYPE_CHOICES = [
+        (ASSIGN_DELIVERY, 'Assign delivery'),
+        (ACCRUE_POINTS, 'Accrue loyalty points'),
+    ]
+
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    event_type = models.CharField(max_length=32, choices=EVENT_TYPE_CHOICES)
+    # Identifies what the event acts on (e.g. "payment:42"); enqueuing the
+    # same event twice is a no-op
+    key = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('event_type', 'key')
+        indexes = [
+            # The worker polls for due events
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.key} - {self.status}"
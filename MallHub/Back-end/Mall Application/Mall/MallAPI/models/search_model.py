@@ -0,0 +1,27 @@
+from django.db import models
+
+class SearchIndexEntry(models.Model):
+    """One term of the inverted index used for product, store and category search"""
+    PRODUCT = 'product'
+    STORE = 'store'
+    CATEGORY = 'category'
+    ENTITY_CHOICES = [
+        (PRODUCT, 'Product'),
+        (STORE, 'Store'),
+        (CATEGORY, 'Category'),
+    ]
+
+    term = models.CharField(max_length=64)
+    entity_type = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    object_id = models.PositiveIntegerField()
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('entity_type', 'object_id', 'term')
+        indexes = [
+            # Prefix lookups seek on (entity_type, term)
+            models.Index(fields=['entity_type', 'term'], name='search_entity_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.entity_type} {self.object_id} ({self.weight})"
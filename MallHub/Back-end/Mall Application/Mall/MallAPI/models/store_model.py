@@ -168,4 +168,26 @@ class Favorite(models.Model):
         ordering = ['-added_at']
 
     def __str__(self):
-        return f"{self.user.name} favorited {self.product.name}"
\ No newline at end of file
+        return f"{self.user.name} favorited {self.product.name}"
+
+class ProductStats(models.Model):
+    """ Denormalized per-product counters, kept in step by the rating, interaction, comment and favorite views. """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    dislikes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    favorites_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTER_FIELDS = ['rating_sum', 'rating_count', 'likes_count', 'dislikes_count', 'comments_count', 'favorites_count']
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    def __str__(self):
+        return f"Stats for product {self.product_id}"
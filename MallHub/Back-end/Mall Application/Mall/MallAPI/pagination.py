@@ -0,0 +1,179 @@
+import base64
+import binascii
+import datetime
+import json
+import logging
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from MallAPI.services.cache_services import CacheGenerationService, build_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    def __init__(self, object_list, per_page, next_cursor=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def pagination_data(self):
+        """Pagination fields returned by cursor-mode list endpoints"""
+        return {
+            'per_page': self.per_page,
+            'has_next': self.has_next(),
+            'next_cursor': self.next_cursor,
+        }
+
+
+class KeysetPaginator:
+    """Cursor pagination that seeks past the last row instead of using OFFSET.
+
+    `ordering` lists the fields the feed is sorted by, all in the same
+    direction, and must end with a unique field such as 'id', e.g.
+    ('-created_at', '-id') or ('name', 'id'). The cursor is an opaque token
+    holding the ordering values of the last row of the previous page. No
+    COUNT query is run; one extra row is fetched to know if more pages exist.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        if per_page < 1:
+            raise ValueError("per_page must be a positive integer")
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("All ordering fields must use the same direction")
+
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.descending = descending.pop()
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(self.decode_cursor(cursor)))
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return CursorPage(rows, self.per_page, next_cursor)
+
+    def encode_cursor(self, obj):
+        values = [self._encode_value(getattr(obj, field)) for field in self.fields]
+        payload = json.dumps(values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor("Invalid cursor")
+
+        model_meta = self.queryset.model._meta
+        try:
+            return [
+                model_meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor("Invalid cursor")
+
+    @staticmethod
+    def _encode_value(value):
+        # Keep full microsecond precision so the seek lands exactly after the last row
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _seek_filter(self, values):
+        # (a, b) > (va, vb)  ==  a > va OR (a = va AND b > vb)
+        lookup = 'lt' if self.descending else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal_prefix = {name: value for name, value in zip(self.fields[:index], values[:index])}
+            condition |= Q(**equal_prefix, **{f'{field}__{lookup}': values[index]})
+        return condition
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose total count is cached per normalized filter set.
+
+    The cached count lives under the current generation of `namespace`, so
+    it is dropped as soon as the underlying rows change (see signals.py).
+    With `allow_estimate`, an unfiltered queryset over a large table uses
+    the database's own row estimate instead of COUNT(*); the result is then
+    flagged through `total_is_approximate`.
+    """
+    COUNT_CACHE_TTL = 60  # seconds
+    ESTIMATE_MIN_ROWS = 10000  # below this an exact COUNT(*) is cheap enough
+
+    def __init__(self, object_list, per_page, namespace, filters=None, allow_estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.namespace = namespace
+        self.filters = filters or {}
+        self.allow_estimate = allow_estimate
+        self.total_is_approximate = False
+
+    @cached_property
+    def count(self):
+        if self.allow_estimate and not self.object_list.query.where:
+            estimate = estimate_row_count(self.object_list.model)
+            if estimate is not None and estimate >= self.ESTIMATE_MIN_ROWS:
+                self.total_is_approximate = True
+                return estimate
+
+        cache_key = self._get_count_cache_key()
+        total = cache.get(cache_key)
+        if total is None:
+            total = super().count
+            cache.set(cache_key, total, self.COUNT_CACHE_TTL)
+        return total
+
+    def _get_count_cache_key(self):
+        generation = CacheGenerationService.get_generation(self.namespace)
+        return build_cache_key(f"count_{self.namespace}_{generation}", **self.filters)
+
+
+def estimate_row_count(model):
+    """The database's planner estimate of a table's row count, or None"""
+    connection = connections[model.objects.db]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [table]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Error estimating row count for {table}: {str(e)}")
+        return None
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
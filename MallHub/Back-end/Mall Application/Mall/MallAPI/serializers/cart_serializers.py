@@ -1,8 +1,7 @@
 from rest_framework import serializers
 from MallAPI.models.cart_model import ShoppingCart, CartItem
-from MallAPI.models.store_model import StoreDiscount
+from MallAPI.services.cart_services import CartPricingEngine
 from .store_serializers import ProductSerializer
-from decimal import Decimal
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -21,26 +20,22 @@ class CartItemSerializer(serializers.ModelSerializer):
             }
         }
 
+    def _get_line(self, obj):
+        # Reuse the cart-wide price breakdown when serialized as part of a cart
+        breakdown = self.context.get('price_breakdown')
+        line = breakdown.get_line(obj) if breakdown is not None else None
+        if line is None:
+            line = CartPricingEngine.price_items([obj]).get_line(obj)
+        return line
+
     def get_discounted_price(self, obj):
-        if not obj.product.store:
-            return None
-            
-        try:
-            discount = StoreDiscount.objects.filter(store=obj.product.store, is_active=True).first()
-            if discount and discount.percentage > 0:
-                discounted_price = float(obj.product.price) * (1 - (float(discount.percentage) / 100))
-                return round(discounted_price, 2)
-        except Exception:
-            pass
+        discounted_price = self._get_line(obj).discounted_price
+        if discounted_price is not None:
+            return float(discounted_price)
         return None
 
     def get_total_price(self, obj):
-        # Check if there's a store discount
-        discounted_price = self.get_discounted_price(obj)
-        if discounted_price is not None:
-            return Decimal(str(discounted_price)) * obj.quantity
-        # Otherwise use regular price
-        return obj.product.price * obj.quantity
+        return self._get_line(obj).line_total
 
     def get_product_image_url(self, obj):
         if obj.product.image:
@@ -57,20 +52,32 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     total = serializers.SerializerMethodField()
     
     class Meta:
         model = ShoppingCart
         fields = ['id', 'items', 'total', 'created_at', 'updated_at']
 
+    def _get_breakdown(self, obj):
+        # Price the cart once and share the breakdown between item
+        # serialization and the total. Callers that already priced the cart
+        # can pass the breakdown in the context.
+        breakdown = self.context.get('price_breakdown')
+        if breakdown is None or breakdown.cart_id != obj.id:
+            breakdown = getattr(self, '_breakdown', None)
+        if breakdown is None or breakdown.cart_id != obj.id:
+            breakdown = CartPricingEngine.price_cart(obj)
+            self._breakdown = breakdown
+        return breakdown
+
+    def get_items(self, obj):
+        breakdown = self._get_breakdown(obj)
+        context = {**self.context, 'price_breakdown': breakdown}
+        return CartItemSerializer(breakdown.items, many=True, context=context).data
+
     def get_total(self, obj):
-        total = Decimal('0.00')
-        for item in obj.items.all():
-            # Get the cart item serializer to use its logic for discounted prices
-            item_serializer = CartItemSerializer(item, context=self.context)
-            total += Decimal(str(item_serializer.get_total_price(item)))
-        return total
+        return self._get_breakdown(obj).total
 
 class CartBillSerializer(ShoppingCartSerializer):
     user_address = serializers.CharField(source='user.address', read_only=True)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from MallAPI.models.store_model import Store, Product, Category,Section, ProductComment, ProductInteraction, CommentInteraction, ProductRating, Favorite, StoreDiscount
 from MallAPI.utils import format_error_message
+from MallAPI.services.cart_services import CartPricingEngine
 from django.db.models import Count, Avg
 
 class StoreDiscountSerializer(serializers.ModelSerializer):
@@ -233,16 +234,10 @@ class ProductListSerializer(serializers.ModelSerializer):
         return self.context.get('user_rating')
         
     def get_discounted_price(self, obj):
-        if not obj.store:
-            return None
-            
-        try:
-            discount = StoreDiscount.objects.filter(store=obj.store, is_active=True).first()
-            if discount and discount.percentage > 0:
-                discounted_price = float(obj.price) * (1 - (float(discount.percentage) / 100))
-                return round(discounted_price, 2)
-        except:
-            pass
+        # Reads the store discount joined by the listing queryset when available
+        percentage = CartPricingEngine.get_active_discount_percentage(obj.store)
+        if percentage is not None:
+            return float(CartPricingEngine.get_discounted_price(obj.price, percentage))
         return None
 
 class StorePaginatedSerializer(serializers.ModelSerializer):
@@ -335,11 +330,9 @@ class ProductWithStoreSerializer(serializers.ModelSerializer):
         if 'request' in self.context:
             include_diamonds = self.context['request'].query_params.get('include_store_diamonds', 'false').lower() == 'true'
         
-        if include_diamonds:
-            from MallAPI.models.Loyalty_models import Diamond
-            
-            # Get diamonds for this product's store
-            diamonds = Diamond.objects.filter(store=obj.store)
+        if include_diamonds and obj.store:
+            # Uses the diamonds prefetched by the listing queryset when available
+            diamonds = obj.store.diamonds.all()
             
             # Return simplified diamond data (just id, quantity, points_value)
             return [{'id': d.id, 'quantity': d.quantity, 'points_value': d.points_value} for d in diamonds]
@@ -347,6 +340,9 @@ class ProductWithStoreSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """ Check if the current user has favorited this product. """
+        # Listing querysets annotate this with an Exists() subquery
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             # Check if a Favorite entry exists for this user and product
@@ -354,16 +350,10 @@ class ProductWithStoreSerializer(serializers.ModelSerializer):
         return False
         
     def get_discounted_price(self, obj):
-        if not obj.store:
-            return None
-            
-        try:
-            discount = StoreDiscount.objects.filter(store=obj.store, is_active=True).first()
-            if discount and discount.percentage > 0:
-                discounted_price = float(obj.price) * (1 - (float(discount.percentage) / 100))
-                return round(discounted_price, 2)
-        except:
-            pass
+        # Reads the store discount joined by the listing queryset when available
+        percentage = CartPricingEngine.get_active_discount_percentage(obj.store)
+        if percentage is not None:
+            return float(CartPricingEngine.get_discounted_price(obj.price, percentage))
         return None
 
 class ProductCommentSerializer(serializers.ModelSerializer):
@@ -395,6 +385,9 @@ class ProductCommentSerializer(serializers.ModelSerializer):
         return None # Handle cases where user might be missing (though unlikely)
 
     def get_replies(self, obj):
+        # Use the tree built by CommentService.load_reply_tree when available
+        if hasattr(obj, 'loaded_replies'):
+            return ProductCommentSerializer(obj.loaded_replies, many=True, context=self.context).data
         # Recursively serialize replies if they exist
         if obj.replies.exists():
             # Pass context and prefetch related user for efficiency
@@ -403,13 +396,16 @@ class ProductCommentSerializer(serializers.ModelSerializer):
         return []
 
     def get_likes_count(self, obj):
-        # Return the count of interactions (likes) for this comment
-        # This count is often more efficiently calculated in the view using annotations,
-        # but doing it here is simpler for now.
+        # Return the count of interactions (likes) for this comment,
+        # preferring the annotation added by CommentService.annotate_comments
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.interactions.count()
 
     def get_user_liked(self, obj):
         # Check if the current user (from context) has liked this comment
+        if hasattr(obj, 'user_liked'):
+            return obj.user_liked
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.interactions.filter(user=user).exists()
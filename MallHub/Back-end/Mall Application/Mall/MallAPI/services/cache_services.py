@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.db import transaction
+import hashlib
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Well under memcached's 250 character limit, leaving room for Django's
+# key prefix and version
+MAX_CACHE_KEY_LENGTH = 200
+SAFE_CACHE_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.:=|+-]*$')
+
+
+def normalize_cache_value(value):
+    """Case-fold, trim and collapse whitespace so equivalent inputs share a key"""
+    if value is None:
+        return ''
+    return ' '.join(str(value).casefold().split())
+
+
+def build_cache_key(prefix, **dimensions):
+    """Build a cache key that is stable, bounded in length and backend-safe.
+
+    Every dimension is normalized and included, sorted by name, so two
+    requests share a key exactly when their normalized inputs match. Keys
+    that would be too long or contain characters some backends reject
+    (spaces, control characters, non-ASCII) are replaced by a hash.
+    """
+    parts = [f"{name}={normalize_cache_value(value)}" for name, value in sorted(dimensions.items())]
+    readable = '|'.join(parts).replace(' ', '+')
+    key = f"{prefix}:{readable}"
+    if len(key) <= MAX_CACHE_KEY_LENGTH and SAFE_CACHE_KEY_PATTERN.match(readable):
+        return key
+    digest = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+    return f"{prefix}:h:{digest}"
+
+class CacheGenerationService:
+    """Generation counters used to invalidate whole groups of cache keys.
+
+    Cache keys embed the current generation of their namespace (e.g.
+    'products' or 'stores'); bumping the generation makes every older key
+    unreachable without having to enumerate and delete them.
+    """
+    KEY_PREFIX = "cache_generation"
+
+    @classmethod
+    def _get_key(cls, namespace):
+        return f"{cls.KEY_PREFIX}_{namespace}"
+
+    @classmethod
+    def get_generation(cls, namespace):
+        key = cls._get_key(namespace)
+        generation = cache.get(key)
+        if generation is None:
+            # Seed from the clock so an evicted counter never reuses old generations
+            cache.add(key, int(time.time()), None)
+            generation = cache.get(key)
+        return generation
+
+    @classmethod
+    def get_generations(cls, namespaces):
+        """Current generations of several namespaces, read in one cache round trip"""
+        keys = [cls._get_key(namespace) for namespace in namespaces]
+        found = cache.get_many(keys)
+        return [
+            found[key] if key in found else cls.get_generation(namespace)
+            for key, namespace in zip(keys, namespaces)
+        ]
+
+    @classmethod
+    def bump_on_commit(cls, namespace):
+        """Bump once the current transaction commits, so no reader can cache
+        pre-commit data under the new generation"""
+        transaction.on_commit(lambda: cls.bump(namespace))
+
+    @classmethod
+    def bump(cls, namespace):
+        key = cls._get_key(namespace)
+        try:
+            cache.add(key, int(time.time()), None)
+            return cache.incr(key)
+        except Exception as e:
+            logger.error(f"Error bumping cache generation for {namespace}: {str(e)}")
+            return None
+
+
+class CacheCounterService:
+    """Shared counters (e.g. cache hits and misses) kept in the cache backend"""
+    KEY_PREFIX = "cache_counter"
+
+    @classmethod
+    def _get_key(cls, name):
+        return f"{cls.KEY_PREFIX}_{name}"
+
+    @classmethod
+    def incr(cls, name):
+        key = cls._get_key(name)
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception as e:
+            logger.error(f"Error incrementing cache counter {name}: {str(e)}")
+
+    @classmethod
+    def get_counts(cls, names):
+        found = cache.get_many([cls._get_key(name) for name in names])
+        return {name: found.get(cls._get_key(name), 0) for name in names}
+
+    @classmethod
+    def reset(cls, names):
+        cache.delete_many([cls._get_key(name) for name in names])
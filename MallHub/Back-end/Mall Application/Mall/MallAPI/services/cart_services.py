@@ -1,30 +1,189 @@
 from MallAPI.models.cart_model import ShoppingCart, CartItem
 from MallAPI.models.store_model import Product, StoreDiscount
-from MallAPI.models.payment_model import Payment
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
+from django.utils import timezone
+from decimal import Decimal, ROUND_HALF_UP
 import logging
 
 logger = logging.getLogger(__name__)
 
+class CartLinePrice:
+    """Price of a single cart item"""
+
+    def __init__(self, item, discounted_price):
+        self.item = item
+        self.product = item.product
+        self.store = item.product.store
+        self.quantity = item.quantity
+        self.unit_price = item.product.price
+        self.discounted_price = discounted_price
+        effective_price = discounted_price if discounted_price is not None else self.unit_price
+        self.line_total = effective_price * item.quantity
+
+class CartPriceBreakdown:
+    """Line totals, per-store subtotals and grand total for one cart"""
+
+    def __init__(self, cart_id=None):
+        self.cart_id = cart_id
+        self.lines = []
+        self.store_subtotals = {}
+        self.total = Decimal('0.00')
+        self._lines_by_item_id = {}
+
+    def add_line(self, line):
+        self.lines.append(line)
+        self._lines_by_item_id[line.item.id] = line
+        self.total += line.line_total
+
+        if line.store is not None:
+            subtotal = self.store_subtotals.setdefault(line.store.id, {
+                'store_id': line.store.id,
+                'store_name': line.store.name,
+                'subtotal': Decimal('0.00'),
+                'item_count': 0
+            })
+            subtotal['subtotal'] += line.line_total
+            subtotal['item_count'] += 1
+
+    @property
+    def items(self):
+        return [line.item for line in self.lines]
+
+    @property
+    def item_count(self):
+        return len(self.lines)
+
+    @property
+    def is_empty(self):
+        return not self.lines
+
+    def get_line(self, item):
+        return self._lines_by_item_id.get(item.id)
+
+class CartPricingEngine:
+    """Prices a cart in one pass using Decimal arithmetic.
+
+    Items, products, stores and store discounts are loaded with a single
+    joined query, and the resulting breakdown is meant to be computed once
+    per request and passed to everything that needs the cart's prices.
+    """
+
+    @staticmethod
+    def get_discounted_price(price, percentage):
+        """Apply a percentage discount to a unit price, rounded to cents"""
+        discounted_price = price * (Decimal('100') - Decimal(str(percentage))) / Decimal('100')
+        return discounted_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    @staticmethod
+    def get_active_discount_percentage(store):
+        """Active discount percentage of a store, or None"""
+        if store is None:
+            return None
+        try:
+            discount = store.discount
+        except StoreDiscount.DoesNotExist:
+            return None
+        if discount.is_active and discount.percentage > 0:
+            return discount.percentage
+        return None
+
+    @classmethod
+    def price_items(cls, items, cart_id=None):
+        breakdown = CartPriceBreakdown(cart_id=cart_id)
+        for item in items:
+            percentage = cls.get_active_discount_percentage(item.product.store)
+            discounted_price = None
+            if percentage is not None:
+                discounted_price = cls.get_discounted_price(item.product.price, percentage)
+            breakdown.add_line(CartLinePrice(item, discounted_price))
+        return breakdown
+
+    @classmethod
+    def price_cart(cls, cart):
+        items = cart.items.select_related('product__store__discount').order_by('id')
+        return cls.price_items(items, cart_id=cart.id)
+
 class CartService:
+    BATCH_OPERATIONS = ('add', 'subtract', 'set', 'remove')
+
     @staticmethod
     def get_or_create_active_cart(user):
-        """Get active cart or create new one if current cart is used in payment"""
-        # Get the most recent cart for the user
-        cart = ShoppingCart.objects.filter(user=user).order_by('-created_at').first()
-        
-        # If cart exists, check if it's used in payment
-        if cart and Payment.objects.filter(cart=cart).exists():
-            # Create new cart since the existing one is used
-            cart = ShoppingCart.objects.create(user=user)
-            
-        # If no cart exists, create new one
-        elif not cart:
-            cart = ShoppingCart.objects.create(user=user)
-            
+        """Get the user's active cart, creating one if there is none"""
+        cart = ShoppingCart.objects.filter(
+            user=user,
+            status=ShoppingCart.ACTIVE
+        ).order_by('-created_at').first()
+
+        if not cart:
+            try:
+                with transaction.atomic():
+                    cart = ShoppingCart.objects.create(user=user)
+            except IntegrityError:
+                # A concurrent request created it first; a locking read sees
+                # that committed row even inside an older snapshot
+                with transaction.atomic():
+                    cart = ShoppingCart.objects.select_for_update().get(
+                        user=user,
+                        status=ShoppingCart.ACTIVE
+                    )
+
         return cart
 
+    @staticmethod
+    def check_out_cart(cart):
+        """Mark an active cart as paid for and open a fresh active cart.
+
+        Must run inside the payment transaction so the active cart only
+        moves together with the payment that consumed it.
+        """
+        updated = ShoppingCart.objects.filter(
+            id=cart.id,
+            status=ShoppingCart.ACTIVE
+        ).update(status=ShoppingCart.CHECKED_OUT, updated_at=timezone.now())
+
+        if not updated:
+            raise ValueError("Cart has already been checked out")
+
+        cart.status = ShoppingCart.CHECKED_OUT
+        return ShoppingCart.objects.create(user_id=cart.user_id)
+
+    @staticmethod
+    def _increment_item(cart, product_id, quantity):
+        """Add to a cart line with one conditional UPDATE, inserting the line if missing"""
+        items = CartItem.objects.filter(cart=cart, product_id=product_id)
+        if items.filter(is_prize_redemption=False).update(quantity=F('quantity') + quantity):
+            return
+
+        product = get_object_or_404(Product, id=product_id)
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        except IntegrityError:
+            # The line already exists: either a concurrent request inserted
+            # it first, or it is a prize item whose quantity is fixed
+            if not items.filter(is_prize_redemption=False).update(quantity=F('quantity') + quantity):
+                raise ValueError("Cannot change quantity of a prize item.")
+
+    @staticmethod
+    def _decrement_item(cart, amount, **lookup):
+        """Subtract from a cart line with one conditional UPDATE, deleting it if it drops to 0"""
+        items = CartItem.objects.filter(cart=cart, is_prize_redemption=False, **lookup)
+        for _ in range(3):
+            if items.filter(quantity__gt=amount).update(quantity=F('quantity') - amount):
+                return False
+            if items.filter(quantity__lte=amount).delete()[0]:
+                return True
+
+            # Nothing matched: the line is missing, is a prize item, or its
+            # quantity changed concurrently between the two statements
+            cart_item = get_object_or_404(CartItem, cart=cart, **lookup)
+            if cart_item.is_prize_redemption:
+                raise ValueError("Cannot change quantity of a prize item.")
+        raise ValueError("Cart item is being modified concurrently, please retry.")
+
     @staticmethod
     def add_to_cart(user, product_id, quantity=1):
         """Add product to cart"""
@@ -32,18 +191,7 @@ class CartService:
             raise ValueError("Quantity must be greater than 0")
             
         cart = CartService.get_or_create_active_cart(user)
-        product = get_object_or_404(Product, id=product_id)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-            
+        CartService._increment_item(cart, product_id, quantity)
         return cart
 
     @staticmethod
@@ -53,15 +201,126 @@ class CartService:
             raise ValueError("Quantity must be greater than 0")
             
         cart = CartService.get_or_create_active_cart(user)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        
-        # Prevent updating quantity for prize items
-        if cart_item.is_prize_redemption:
+        updated = CartItem.objects.filter(
+            id=item_id,
+            cart=cart,
+            is_prize_redemption=False
+        ).update(quantity=quantity)
+
+        if not updated:
+            # Either the item doesn't exist or it is a prize item
+            get_object_or_404(CartItem, id=item_id, cart=cart)
             raise ValueError("Cannot change quantity of a prize item.")
             
-        cart_item.quantity = quantity
-        cart_item.save()
-            
+        return cart
+
+    @staticmethod
+    def apply_quantity_deltas(user, deltas):
+        """Apply a list of {'product_id', 'delta'} changes to the cart in one transaction.
+
+        Positive deltas add to (or create) the product's line, negative
+        deltas subtract from it and remove the line when it reaches 0.
+        """
+        if not isinstance(deltas, list) or not deltas:
+            raise ValueError("Deltas must be a non-empty list")
+
+        operations = []
+        for entry in deltas:
+            try:
+                product_id = int(entry['product_id'])
+                delta = int(entry['delta'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Each delta requires an integer product_id and delta")
+            if delta == 0:
+                raise ValueError("Delta must not be 0")
+            operations.append({
+                'op': 'add' if delta > 0 else 'subtract',
+                'product_id': product_id,
+                'quantity': abs(delta)
+            })
+
+        return CartService.apply_batch_operations(user, operations)
+
+    @staticmethod
+    def apply_batch_operations(user, operations):
+        """Apply a list of add / subtract / set / remove operations to the cart at once.
+
+        Each operation is {'op': 'add' | 'subtract' | 'set' | 'remove', 'product_id',
+        'quantity'} ('quantity' is not used by 'remove'); subtracting a line
+        down to 0 removes it. All products are validated with one query and
+        the resulting changes are written with bulk statements in a single
+        transaction.
+        """
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("Operations must be a non-empty list")
+
+        parsed = []
+        for operation in operations:
+            try:
+                op = operation['op']
+                product_id = int(operation['product_id'])
+                quantity = int(operation.get('quantity', 0)) if op != 'remove' else 0
+            except (KeyError, TypeError, ValueError, AttributeError):
+                raise ValueError("Each operation requires an op and an integer product_id")
+            if op not in CartService.BATCH_OPERATIONS:
+                raise ValueError(f"Invalid operation '{op}'. Use one of: {', '.join(CartService.BATCH_OPERATIONS)}")
+            if op != 'remove' and quantity <= 0:
+                raise ValueError("Quantity must be greater than 0")
+            parsed.append((op, product_id, quantity))
+
+        product_ids = {product_id for _, product_id, _ in parsed}
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise Http404(f"Products not found: {', '.join(str(product_id) for product_id in missing)}")
+
+        cart = CartService.get_or_create_active_cart(user)
+        with transaction.atomic():
+            existing = {
+                item.product_id: item
+                for item in CartItem.objects.select_for_update().filter(cart=cart)
+            }
+            quantities = {product_id: item.quantity for product_id, item in existing.items()}
+
+            for op, product_id, quantity in parsed:
+                item = existing.get(product_id)
+                if item is not None and item.is_prize_redemption:
+                    raise ValueError("Cannot change quantity of a prize item.")
+                if op == 'add':
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+                elif op == 'subtract':
+                    if product_id not in quantities:
+                        raise Http404(f"Product {product_id} is not in the cart")
+                    remaining = quantities.pop(product_id) - quantity
+                    if remaining > 0:
+                        quantities[product_id] = remaining
+                elif op == 'set':
+                    quantities[product_id] = quantity
+                else:
+                    quantities.pop(product_id, None)
+
+            to_delete = [item.id for product_id, item in existing.items() if product_id not in quantities]
+            to_update = []
+            to_create = []
+            for product_id, quantity in quantities.items():
+                item = existing.get(product_id)
+                if item is None:
+                    to_create.append(CartItem(cart=cart, product=products[product_id], quantity=quantity))
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    to_update.append(item)
+
+            if to_delete:
+                CartItem.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                CartItem.objects.bulk_update(to_update, ['quantity'])
+            if to_create:
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.bulk_create(to_create)
+                except IntegrityError:
+                    raise ValueError("Cart was modified concurrently, please retry.")
+
         return cart
 
     @staticmethod
@@ -88,8 +347,7 @@ class CartService:
         try:
             discount = StoreDiscount.objects.filter(store=product.store, is_active=True).first()
             if discount and discount.percentage > 0:
-                discounted_price = float(product.price) * (1 - (float(discount.percentage) / 100))
-                return Decimal(str(round(discounted_price, 2)))
+                return CartPricingEngine.get_discounted_price(product.price, discount.percentage)
         except Exception as e:
             logger.error(f"Error calculating discount: {str(e)}")
             
@@ -98,15 +356,7 @@ class CartService:
     @staticmethod
     def get_cart_total(cart):
         """Calculate cart total considering store discounts"""
-        total = Decimal('0.00')
-        for item in cart.items.all():
-            # Check for store discount
-            discounted_price = CartService.get_discounted_price(item.product)
-            if discounted_price is not None:
-                total += discounted_price * item.quantity
-            else:
-                total += item.product.price * item.quantity
-        return total
+        return CartPricingEngine.price_cart(cart).total
 
     @staticmethod
     def decrease_cart_item_quantity(user, item_id):
@@ -114,30 +364,21 @@ class CartService:
         try:
             # Convert item_id to integer if it's a string
             item_id = int(item_id)
-            
+        except (TypeError, ValueError):
+            logger.error(f"Invalid item_id format: {item_id}")
+            raise ValueError("Invalid item ID format")
+
+        try:
             cart = CartService.get_or_create_active_cart(user)
-            cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-            
-            # Prevent decreasing quantity for prize items
-            if cart_item.is_prize_redemption:
-                raise ValueError("Cannot change quantity of a prize item.")
-            
-            logger.info(f"Current quantity for item {item_id}: {cart_item.quantity}")
-            
-            if cart_item.quantity > 1:
-                cart_item.quantity -= 1
-                cart_item.save()
-                logger.info(f"Decreased quantity to: {cart_item.quantity}")
-            else:
-                # If quantity would become 0, remove the item
-                cart_item.delete()
+            removed = CartService._decrement_item(cart, 1, id=item_id)
+
+            if removed:
                 logger.info(f"Removed item {item_id} from cart")
+            else:
+                logger.info(f"Decreased quantity for item {item_id}")
             
             return cart
             
-        except ValueError:
-            logger.error(f"Invalid item_id format: {item_id}")
-            raise ValueError("Invalid item ID format")
         except Exception as e:
             logger.error(f"Error in decrease_cart_item_quantity: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
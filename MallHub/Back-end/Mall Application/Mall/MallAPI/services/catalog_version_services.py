@@ -0,0 +1,84 @@
+import hashlib
+from django.db.models import Max, Count, Sum, OuterRef, Subquery
+from MallAPI.models.section_model import Section
+from MallAPI.models.store_model import Store, Product, Category
+from MallAPI.models.Loyalty_models import Diamond
+from MallAPI.services.cache_services import CacheGenerationService
+from MallAPI.services.product_detail_services import ProductDetailService
+
+class CatalogVersionService:
+    """(etag, last_modified) validators for the public catalog endpoints.
+
+    List validators come from one aggregate over `updated_at` plus the row
+    count, so deletions change the ETag too. Changes that do not touch any
+    `updated_at` (category links, bulk diamond updates, a user's own
+    favorites) are covered by cache generations, extra aggregates or the
+    values themselves mixed into the ETag. No endpoint sends Last-Modified:
+    a deletion or a link change can leave every remaining `updated_at` as
+    it was, so If-Modified-Since alone would answer 304 for a changed list.
+    """
+
+    @staticmethod
+    def make_etag(*parts):
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def for_queryset(cls, queryset, *extra_parts):
+        summary = queryset.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+        etag = cls.make_etag(summary['total'], summary['last_modified'], *extra_parts)
+        return etag, None
+
+    @classmethod
+    def store_list(cls, request):
+        return cls.for_queryset(Store.objects.all())
+
+    @classmethod
+    def category_list(cls, request):
+        return cls.for_queryset(Category.objects.all())
+
+    @classmethod
+    def section_list(cls, request):
+        # The response echoes the user's role
+        return cls.for_queryset(Section.objects.all(), request.user.role)
+
+    @staticmethod
+    def _store_subquery(queryset, aggregate):
+        return Subquery(
+            queryset.filter(store=OuterRef('pk')).values('store').annotate(value=aggregate).values('value')
+        )
+
+    @classmethod
+    def store_detail(cls, request, store_id):
+        store = Store.objects.filter(id=store_id).annotate(
+            discount_modified=Max('discount__updated_at'),
+            products_modified=cls._store_subquery(Product.objects.all(), Max('updated_at')),
+            products_total=cls._store_subquery(Product.objects.all(), Count('id')),
+            diamonds_modified=cls._store_subquery(Diamond.objects.all(), Max('updated_at')),
+            diamonds_total=cls._store_subquery(Diamond.objects.all(), Count('id')),
+            # Points values are also changed in bulk, without touching updated_at
+            diamonds_points=cls._store_subquery(Diamond.objects.all(), Sum('points_value')),
+        ).values(
+            'updated_at', 'discount_modified', 'products_modified', 'products_total',
+            'diamonds_modified', 'diamonds_total', 'diamonds_points'
+        ).get()
+
+        # Category links and names have no timestamp on the store's side
+        generations = CacheGenerationService.get_generations(
+            [ProductDetailService.store_namespace(store_id), 'categories']
+        )
+        etag = cls.make_etag(
+            store_id, request.query_params.get('include_diamonds', ''),
+            sorted(store.items()), generations
+        )
+        return etag, None
+
+    @classmethod
+    def product_detail(cls, request, product_id):
+        # Served from the cached shared payload, so normally no query at all
+        entry = ProductDetailService.get_shared_payload(product_id, request)
+        parts = [product_id, entry['generation'], entry['versions']]
+        if request.user.is_authenticated:
+            # The user's own fields, reused by the view when it runs
+            user_fields = ProductDetailService.get_request_user_fields(request, product_id)
+            parts += [request.user.id, sorted(user_fields.items())]
+        return cls.make_etag(*parts), None
@@ -0,0 +1,84 @@
+from django.db import transaction
+from MallAPI.models.cart_model import ShoppingCart
+from MallAPI.services.cart_services import CartService, CartPricingEngine
+from MallAPI.services.loyalty_services import LoyaltyService
+from MallAPI.services.outbox_services import OutboxService
+from MallAPI.services.payment_services import PayFlexService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CheckoutResult:
+    """Everything a checkout produced, for building the response without
+    going back to the database"""
+
+    def __init__(self, payment, breakdown, points_preview, discount_details=None):
+        self.payment = payment
+        self.breakdown = breakdown
+        self.points_preview = points_preview
+        self.discount_details = discount_details
+
+class CheckoutService:
+    """Pays for the user's active cart in a single transaction.
+
+    The cart is locked and loaded once, priced once and its per-store
+    diamond rows read once; the payment, discount consumption and cart
+    rollover then commit together with the outbox events for the delivery
+    assignment and points accrual, which the process_outbox worker carries
+    out (and retries) after the commit.
+    """
+
+    @staticmethod
+    def _lock_active_cart(user):
+        cart = ShoppingCart.objects.select_for_update().filter(
+            user=user,
+            status=ShoppingCart.ACTIVE
+        ).order_by('-created_at').first()
+        if cart is None:
+            raise ValueError("Cart is empty")
+        return cart
+
+    @staticmethod
+    def checkout(user, card_details, discount_code=None):
+        """Returns a CheckoutResult; raises ValueError for checkout errors"""
+        with transaction.atomic():
+            # Concurrent checkouts of the same cart wait here
+            cart = CheckoutService._lock_active_cart(user)
+
+            breakdown = CartPricingEngine.price_cart(cart)
+            if breakdown.is_empty:
+                raise ValueError("Cart is empty")
+
+            store_rows = list(LoyaltyService.get_cart_store_diamonds(cart))
+            points_preview = LoyaltyService.summarize_store_points(store_rows)
+
+            # Determine final amount: Apply discount if code is valid
+            final_amount = breakdown.total
+            discount_details = None
+            if discount_code:
+                try:
+                    discount_details = LoyaltyService.apply_discount_code(discount_code, cart.id, breakdown=breakdown)
+                except ValueError as e:
+                    raise ValueError(f"Discount code error: {e}")
+                final_amount = discount_details['final_amount']
+                logger.info(f"Discount {discount_code} applied. Final amount: {final_amount}")
+
+            payment = PayFlexService.process_payment(
+                user=user,
+                cart=cart,
+                amount=final_amount,
+                card_details=card_details
+            )
+
+            # Move the user's active cart pointer together with the payment
+            CartService.check_out_cart(cart)
+
+            # Delivery and loyalty points run in the outbox worker
+            OutboxService.enqueue_payment_events(payment)
+
+        return CheckoutResult(
+            payment=payment,
+            breakdown=breakdown,
+            points_preview=points_preview,
+            discount_details=discount_details
+        )
@@ -1,5 +1,6 @@
-from django.db.models import Q
 from MallAPI.models.store_model import Category, Store, Product
+from MallAPI.models.search_model import SearchIndexEntry
+from MallAPI.services.search_index_services import SearchIndexService
 
 class CustomerService:
     @staticmethod
@@ -21,18 +22,13 @@ class CustomerService:
     @staticmethod
     def search(query):
         return {
-            'categories': Category.objects.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query)
-            ),
-            'stores': Store.objects.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query),
-                owner__is_active=True
-            ),
-            'products': Product.objects.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query),
-                store__owner__is_active=True
-            )
+            'categories': SearchIndexService.apply_search(
+                Category.objects.all(), SearchIndexEntry.CATEGORY, query
+            ).order_by('-search_rank', 'id'),
+            'stores': SearchIndexService.apply_search(
+                Store.objects.filter(owner__is_active=True), SearchIndexEntry.STORE, query
+            ).order_by('-search_rank', 'id'),
+            'products': SearchIndexService.apply_search(
+                Product.objects.filter(store__owner__is_active=True), SearchIndexEntry.PRODUCT, query
+            ).order_by('-search_rank', 'id')
         }
\ No newline at end of file
@@ -0,0 +1,153 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from MallAPI.models.delivery_model import DeliveryOrder
+from MallAPI.models.user_model import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeliveryAssignmentEngine:
+    """Hands each new delivery order to the courier with the fewest open
+    (PENDING or IN_PROGRESS) orders.
+
+    Workloads are loaded with one grouped query and kept in a dict plus a
+    min-heap of (open_orders, courier_id), so every pick is O(log n) in the
+    number of couriers. Heap entries that no longer match the dict are
+    stale and skipped when they reach the top.
+
+    shared() returns a process-wide engine that is reloaded every
+    REFRESH_INTERVAL seconds; between reloads it only sees this process's
+    own assignments, so workloads can drift briefly across workers (or after
+    a rolled-back assignment) but never for longer than the interval.
+    """
+    OPEN_STATUSES = ('PENDING', 'IN_PROGRESS')
+    REFRESH_INTERVAL = 10.0  # seconds
+
+    _shared = None
+    _shared_loaded_at = 0.0
+    _shared_lock = threading.Lock()
+
+    def __init__(self, loads):
+        self._loads = dict(loads)
+        self._heap = [(load, courier_id) for courier_id, load in self._loads.items()]
+        heapq.heapify(self._heap)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_open_loads(cls):
+        """{courier_id: open orders} of every active courier"""
+        return dict(
+            User.objects.filter(role='DELIVERY', is_active=True).annotate(
+                open_orders=Count('deliveries', filter=Q(deliveries__status__in=cls.OPEN_STATUSES))
+            ).values_list('id', 'open_orders')
+        )
+
+    @classmethod
+    def load(cls):
+        return cls(cls.get_open_loads())
+
+    @classmethod
+    def shared(cls):
+        now = time.monotonic()
+        with cls._shared_lock:
+            if cls._shared is None or now - cls._shared_loaded_at >= cls.REFRESH_INTERVAL:
+                cls._shared = cls.load()
+                cls._shared_loaded_at = now
+            return cls._shared
+
+    @classmethod
+    def reset_shared(cls):
+        """Make the next shared() call reload workloads from the database"""
+        with cls._shared_lock:
+            cls._shared = None
+
+    @property
+    def loads(self):
+        with self._lock:
+            return dict(self._loads)
+
+    def pick(self):
+        """The least-loaded courier's id, counting the new order against them"""
+        with self._lock:
+            while self._heap:
+                load, courier_id = self._heap[0]
+                if self._loads.get(courier_id) != load:
+                    heapq.heappop(self._heap)
+                    continue
+                self._loads[courier_id] = load + 1
+                heapq.heapreplace(self._heap, (load + 1, courier_id))
+                return courier_id
+        raise ValueError("No delivery users available")
+
+    def adjust(self, courier_id, delta):
+        """Account for orders gained or lost outside pick()"""
+        with self._lock:
+            if courier_id not in self._loads:
+                return
+            load = max(self._loads[courier_id] + delta, 0)
+            self._loads[courier_id] = load
+            heapq.heappush(self._heap, (load, courier_id))
+            if len(self._heap) > 2 * len(self._loads) + 16:
+                # Drop the stale entries left behind by adjustments
+                self._heap = [(load, courier_id) for courier_id, load in self._loads.items()]
+                heapq.heapify(self._heap)
+
+    @classmethod
+    def rebalance(cls):
+        """Move PENDING orders from overloaded couriers to underloaded ones.
+
+        IN_PROGRESS orders stay where they are; pending orders are spread on
+        top of them least-loaded first, each courier keeping their oldest
+        pending orders up to their share. Orders of couriers that are no
+        longer active are always moved. Returns the number of orders moved.
+        """
+        with transaction.atomic():
+            pending = list(
+                DeliveryOrder.objects.select_for_update().filter(
+                    status='PENDING'
+                ).order_by('assigned_at', 'id').values_list('id', 'delivery_user_id')
+            )
+            couriers = list(
+                User.objects.filter(role='DELIVERY', is_active=True).order_by('id').values_list('id', flat=True)
+            )
+            if not pending or not couriers:
+                return 0
+
+            in_progress = dict(
+                DeliveryOrder.objects.filter(
+                    status='IN_PROGRESS', delivery_user_id__in=couriers
+                ).values('delivery_user_id').annotate(orders=Count('id')).values_list('delivery_user_id', 'orders')
+            )
+            engine = cls({courier_id: in_progress.get(courier_id, 0) for courier_id in couriers})
+            for _ in pending:
+                engine.pick()
+            targets = engine.loads
+
+            # Pending orders each courier may keep; what is left afterwards are free slots
+            slots = {courier_id: targets[courier_id] - in_progress.get(courier_id, 0) for courier_id in couriers}
+            moving = []
+            for order_id, courier_id in pending:
+                if slots.get(courier_id, 0) > 0:
+                    slots[courier_id] -= 1
+                else:
+                    moving.append(order_id)
+
+            receivers = (courier_id for courier_id in couriers for _ in range(slots[courier_id]))
+            moves = defaultdict(list)
+            for order_id, courier_id in zip(moving, receivers):
+                moves[courier_id].append(order_id)
+
+            # QuerySet.update() skips auto_now
+            now = timezone.now()
+            for courier_id, order_ids in moves.items():
+                DeliveryOrder.objects.filter(id__in=order_ids).update(delivery_user_id=courier_id, updated_at=now)
+
+        if moving:
+            logger.info(f"Rebalanced {len(moving)} pending delivery orders across {len(couriers)} couriers")
+            cls.reset_shared()
+        return len(moving)
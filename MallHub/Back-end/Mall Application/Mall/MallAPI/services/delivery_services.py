@@ -2,41 +2,89 @@ from django.utils import timezone
 from MallAPI.models.delivery_model import DeliveryOrder, ReturnOrder
 from MallAPI.models.payment_model import Payment
 from MallAPI.models.user_model import User
+from MallAPI.services.delivery_assignment_services import DeliveryAssignmentEngine
 
 class DeliveryService:
     @staticmethod
-    def assign_delivery(payment_id):
-        """Assign a delivery to an available delivery user"""
+    def assign_delivery(payment_id, engine=None):
+        """Assign a delivery to the least-loaded delivery user"""
         try:
             payment = Payment.objects.get(id=payment_id)
-            
-            # Find any delivery user
-            delivery_user = User.objects.filter(role='DELIVERY').first()
-            
-            if not delivery_user:
-                raise ValueError("No delivery users available")
-            
-            # Check if delivery order already exists
-            delivery_order, created = DeliveryOrder.objects.get_or_create(
-                payment=payment,
-                defaults={
-                    'delivery_user': delivery_user,
-                    'status': 'PENDING'
-                }
-            )
-            
-            if not created:
-                print(f"Delivery order already exists for payment {payment_id}")
-            else:
-                print(f"Created new delivery order {delivery_order.id}")
-                
-            return delivery_order
-            
+            return DeliveryService.create_delivery_order(payment, engine=engine)
         except Payment.DoesNotExist:
             raise ValueError(f"Payment {payment_id} not found")
         except Exception as e:
             raise ValueError(f"Error assigning delivery: {str(e)}")
 
+    @staticmethod
+    def create_delivery_order(payment, engine=None):
+        """Create the delivery order of a payment already in hand"""
+        engine = engine or DeliveryAssignmentEngine.shared()
+        delivery_user_id = engine.pick()
+        
+        # Check if delivery order already exists
+        delivery_order, created = DeliveryOrder.objects.get_or_create(
+            payment=payment,
+            defaults={
+                'delivery_user_id': delivery_user_id,
+                'status': 'PENDING'
+            }
+        )
+        
+        if not created:
+            engine.adjust(delivery_user_id, -1)
+            print(f"Delivery order already exists for payment {payment.id}")
+        else:
+            print(f"Created new delivery order {delivery_order.id}")
+            
+        return delivery_order
+
+    @staticmethod
+    def get_unassigned_payment_ids():
+        """Ids of completed payments that have no delivery order yet"""
+        return Payment.objects.filter(
+            status=Payment.COMPLETED,
+            deliveryorder__isnull=True
+        ).order_by('id').values_list('id', flat=True)
+
+    @staticmethod
+    def bulk_create_delivery_orders(payment_ids, engine, dry_run=False):
+        """Assign a chunk of payments with one insert; returns the orders created.
+
+        Payments that got an order since the ids were read are skipped, and
+        orders dropped because a concurrent assignment inserted first are
+        left out, with the engine's workloads corrected to match. With
+        dry_run the assignments are only counted against the engine.
+        """
+        existing = set(
+            DeliveryOrder.objects.filter(payment_id__in=payment_ids).values_list('payment_id', flat=True)
+        )
+        orders = [
+            DeliveryOrder(payment_id=payment_id, delivery_user_id=engine.pick(), status='PENDING')
+            for payment_id in payment_ids
+            if payment_id not in existing
+        ]
+        if not orders or dry_run:
+            return orders
+
+        # A concurrent assignment of the same payment wins; ours is dropped
+        DeliveryOrder.objects.bulk_create(orders, ignore_conflicts=True)
+        assigned = dict(
+            DeliveryOrder.objects.filter(
+                payment_id__in=[order.payment_id for order in orders]
+            ).values_list('payment_id', 'delivery_user_id')
+        )
+        created = []
+        for order in orders:
+            delivery_user_id = assigned.get(order.payment_id)
+            if delivery_user_id == order.delivery_user_id:
+                created.append(order)
+                continue
+            engine.adjust(order.delivery_user_id, -1)
+            if delivery_user_id is not None:
+                engine.adjust(delivery_user_id, 1)
+        return created
+
     @staticmethod
     def update_delivery_status(delivery_id, status, user):
         """Update delivery status"""
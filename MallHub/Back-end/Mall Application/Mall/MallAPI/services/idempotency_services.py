@@ -0,0 +1,187 @@
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from MallAPI.models.idempotency_model import IdempotencyRecord
+from MallAPI.utils import format_error_message
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyService:
+    """Stores the outcome of POSTs made with an Idempotency-Key header.
+
+    The first request with a key claims an IN_PROGRESS record, then runs
+    and stores its response in one transaction, so the side effects and the
+    COMPLETED record commit together; retries with the same key get that
+    response back (from the cache, or one indexed lookup) without running
+    the view again. A claim whose request died before committing is taken
+    over by a retry once it is older than CLAIM_TIMEOUT. Keys are scoped
+    per user and endpoint. Server errors are not stored, so a request that
+    failed with a 5xx can be retried for real.
+    """
+    HEADER = 'Idempotency-Key'
+    MAX_KEY_LENGTH = 255
+    CACHE_TTL = 60 * 60  # seconds
+    RECORD_TTL = timedelta(days=1)
+    CLAIM_TIMEOUT = timedelta(minutes=5)
+
+    @staticmethod
+    def _get_cache_key(user_id, endpoint, key):
+        # Keys are opaque and case-sensitive, so hash rather than normalize them
+        digest = hashlib.sha256(f"{user_id}|{endpoint}|{key}".encode('utf-8')).hexdigest()
+        return f"idempotency:{digest}"
+
+    @staticmethod
+    def hash_request(request, fingerprint=None):
+        # Keyed, so a stored hash cannot be brute-forced back into the body
+        data = fingerprint(request.data) if fingerprint else request.data
+        body = json.dumps(data, sort_keys=True, default=str)
+        return hmac.new(settings.SECRET_KEY.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def get_completed(cls, user_id, endpoint, key):
+        """(request_hash, status, body) of a completed request, or None"""
+        cache_key = cls._get_cache_key(user_id, endpoint, key)
+        snapshot = cache.get(cache_key)
+        if snapshot is not None:
+            return snapshot
+
+        record = IdempotencyRecord.objects.filter(
+            user_id=user_id, endpoint=endpoint, key=key, status=IdempotencyRecord.COMPLETED
+        ).first()
+        if record is None:
+            return None
+        snapshot = (record.request_hash, record.response_status, record.response_body)
+        cache.set(cache_key, snapshot, cls.CACHE_TTL)
+        return snapshot
+
+    @staticmethod
+    def claim(user_id, endpoint, key, request_hash):
+        """Create the IN_PROGRESS record; returns None if the key is taken"""
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    user_id=user_id, endpoint=endpoint, key=key, request_hash=request_hash
+                )
+        except IntegrityError:
+            return None
+
+    @classmethod
+    def take_over(cls, user_id, endpoint, key, request_hash):
+        """Claim an IN_PROGRESS record of the same request that is older than
+        CLAIM_TIMEOUT (its request died before committing); None if there is none"""
+        now = timezone.now()
+        records = IdempotencyRecord.objects.filter(user_id=user_id, endpoint=endpoint, key=key)
+        taken = records.filter(
+            status=IdempotencyRecord.IN_PROGRESS,
+            request_hash=request_hash,
+            claimed_at__lt=now - cls.CLAIM_TIMEOUT
+        ).update(claimed_at=now)
+        if not taken:
+            return None
+        logger.warning(f"Took over stale idempotency claim {endpoint} {key} of user {user_id}")
+        return records.get()
+
+    @classmethod
+    def complete(cls, record, response):
+        """Mark the record completed; call in the transaction of the request's side effects"""
+        # Store the rendered JSON so replays match the original byte for byte
+        body = json.loads(JSONRenderer().render(response.data)) if response.data is not None else None
+        record.status = IdempotencyRecord.COMPLETED
+        record.response_status = response.status_code
+        record.response_body = body
+        record.completed_at = timezone.now()
+        record.save(update_fields=['status', 'response_status', 'response_body', 'completed_at'])
+        transaction.on_commit(lambda: cache.set(
+            cls._get_cache_key(record.user_id, record.endpoint, record.key),
+            (record.request_hash, record.response_status, body),
+            cls.CACHE_TTL
+        ))
+
+    @staticmethod
+    def release(record):
+        """Forget a claimed key so the request can be retried"""
+        record.delete()
+
+    @classmethod
+    def purge_expired(cls):
+        """Delete records older than RECORD_TTL; returns how many"""
+        deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - cls.RECORD_TTL).delete()
+        return deleted
+
+
+def _replay(snapshot, request_hash):
+    stored_hash, response_status, body = snapshot
+    if stored_hash != request_hash:
+        return Response(
+            format_error_message("Idempotency-Key was already used for a different request"),
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(body, status=response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(endpoint, fingerprint=None):
+    """Honour an Idempotency-Key header on an authenticated APIView POST.
+
+    Requests without the header run as before. `fingerprint(data)` picks the
+    parts of the body that identify a request, for bodies holding secrets
+    that must not be stored in any form.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(IdempotencyService.HEADER)
+            if not key:
+                return method(view, request, *args, **kwargs)
+            if len(key) > IdempotencyService.MAX_KEY_LENGTH:
+                return Response(
+                    format_error_message(f"Idempotency-Key must be at most {IdempotencyService.MAX_KEY_LENGTH} characters"),
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            user_id = request.user.id
+            request_hash = IdempotencyService.hash_request(request, fingerprint)
+
+            snapshot = IdempotencyService.get_completed(user_id, endpoint, key)
+            if snapshot is not None:
+                return _replay(snapshot, request_hash)
+
+            record = IdempotencyService.claim(user_id, endpoint, key, request_hash)
+            if record is None:
+                # Completed between our two lookups, still running, or abandoned
+                snapshot = IdempotencyService.get_completed(user_id, endpoint, key)
+                if snapshot is not None:
+                    return _replay(snapshot, request_hash)
+                record = IdempotencyService.take_over(user_id, endpoint, key, request_hash)
+                if record is None:
+                    return Response(
+                        format_error_message("A request with this Idempotency-Key is still being processed"),
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+            try:
+                # The view's writes and the stored response commit together
+                with transaction.atomic():
+                    response = method(view, request, *args, **kwargs)
+                    if response.status_code < 500:
+                        IdempotencyService.complete(record, response)
+            except Exception:
+                IdempotencyService.release(record)
+                raise
+
+            if response.status_code >= 500:
+                IdempotencyService.release(record)
+            return response
+        return wrapper
+    return decorator
@@ -1,29 +1,77 @@
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Sum, F, Case, When, Value, IntegerField, DecimalField, OuterRef, Subquery
 from MallAPI.models.Loyalty_models import Diamond, UserPoints, Prize, PrizeRedemption, GlobalLoyaltySetting
 from MallAPI.models.store_model import Store
 from MallAPI.models.cart_model import ShoppingCart, CartItem
 from MallAPI.models.payment_model import Payment
 from MallAPI.models.discount_model import DiscountCode
 from django.utils import timezone
-from MallAPI.services.cart_services import CartService
+from MallAPI.services.cart_services import CartService, CartPricingEngine
+from MallAPI.services.cache_services import CacheGenerationService
 import random
 import string
+import threading
+import time
 from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
 
+class LoyaltySettingsCache:
+    """Process-local copy of the GlobalLoyaltySetting singleton.
+
+    Saving the settings bumps the 'loyalty_settings' cache generation once
+    the transaction commits (see signals.py); each worker compares its copy's
+    generation at most once per GENERATION_CHECK_INTERVAL and reloads when
+    it changed, so reads normally cost neither a query nor a cache lookup.
+    """
+    GENERATION_CHECK_INTERVAL = 1.0  # seconds
+    NAMESPACE = 'loyalty_settings'
+
+    _settings = None
+    _generation = None
+    _checked_at = 0.0
+    _lock = threading.RLock()
+
+    @classmethod
+    def get(cls):
+        """The current settings; treat the returned instance as read-only"""
+        now = time.monotonic()
+        settings = cls._settings
+        if settings is not None and now - cls._checked_at < cls.GENERATION_CHECK_INTERVAL:
+            return settings
+
+        with cls._lock:
+            generation = CacheGenerationService.get_generation(cls.NAMESPACE)
+            if cls._settings is None or generation != cls._generation:
+                cls._settings = GlobalLoyaltySetting.get_settings()
+                cls._generation = generation
+            cls._checked_at = now
+            return cls._settings
+
+    @classmethod
+    def invalidate(cls):
+        CacheGenerationService.bump(cls.NAMESPACE)
+        with cls._lock:
+            cls._settings = None
+
+    @classmethod
+    def invalidate_on_commit(cls):
+        # Reloading before the commit would cache the old row again
+        transaction.on_commit(cls.invalidate)
+
+
 class LoyaltyService:
     @staticmethod
     def get_global_settings():
-        """Get global loyalty settings"""
-        return GlobalLoyaltySetting.get_settings()
+        """Get global loyalty settings (cached, read-only)"""
+        return LoyaltySettingsCache.get()
     
     @staticmethod
     def update_global_diamond_points_value(points_value):
         """Update global diamond points value"""
+        # Read the row itself; the cached copy must not be modified
         settings = GlobalLoyaltySetting.get_settings()
         settings.diamond_points_value = points_value
         settings.save()
@@ -45,7 +93,7 @@ class LoyaltyService:
         store = get_object_or_404(Store, id=store_id)
         
         # Always use global diamond points value
-        settings = GlobalLoyaltySetting.get_settings()
+        settings = LoyaltyService.get_global_settings()
         points_value = settings.diamond_points_value
             
         diamond = Diamond.objects.create(
@@ -61,7 +109,7 @@ class LoyaltyService:
         diamond = get_object_or_404(Diamond, id=diamond_id)
         
         # Always use global value - enforcing the global setting
-        settings = GlobalLoyaltySetting.get_settings()
+        settings = LoyaltyService.get_global_settings()
         kwargs['points_value'] = settings.diamond_points_value
         
         for key, value in kwargs.items():
@@ -156,52 +204,92 @@ class LoyaltyService:
         user_points.points += points
         user_points.save()
         return user_points
+
+    @staticmethod
+    def add_points_bulk(user_id, points_by_store):
+        """Add points to several of a user's store accounts at once.
+
+        `points_by_store` maps store id -> points to add. Missing UserPoints
+        rows are inserted, then every balance is incremented in the database
+        by one UPDATE, so concurrent accruals cannot lose points. Returns
+        the new balances by store id.
+        """
+        if not points_by_store:
+            return {}
+
+        with transaction.atomic():
+            UserPoints.objects.bulk_create(
+                [UserPoints(user_id=user_id, store_id=store_id, points=0) for store_id in points_by_store],
+                ignore_conflicts=True
+            )
+            user_points = UserPoints.objects.filter(user_id=user_id, store_id__in=points_by_store)
+            user_points.update(
+                points=F('points') + Case(
+                    *[When(store_id=store_id, then=Value(points)) for store_id, points in points_by_store.items()],
+                    default=Value(0),
+                    output_field=IntegerField()
+                ),
+                # QuerySet.update() skips auto_now
+                updated_at=timezone.now()
+            )
+            return dict(user_points.values_list('store_id', 'points'))
     
+    @staticmethod
+    def _plan_points_deduction(records, store_id, points_to_deduct):
+        """Deduct `points_to_deduct` from in-memory UserPoints records.
+
+        Points of the prize's store (`store_id`, may be None) are spent
+        first, then the other stores' from the highest balance down.
+        Returns the records that changed.
+        """
+        prize_store_records = [record for record in records if record.store_id == store_id]
+        other_records = sorted(
+            (record for record in records if record.store_id != store_id),
+            key=lambda record: (-record.points, record.pk)
+        )
+
+        changed_records = []
+        for record in prize_store_records + other_records:
+            if points_to_deduct <= 0:
+                break
+            deduct_from_this_store = min(record.points, points_to_deduct)
+            if deduct_from_this_store:
+                record.points -= deduct_from_this_store
+                points_to_deduct -= deduct_from_this_store
+                changed_records.append(record)
+
+        # Ensure all points were deducted (shouldn't happen if total check passed, but good validation)
+        if points_to_deduct > 0:
+            # This indicates a logic error, rollback transaction
+            raise Exception("Failed to deduct all required points despite sufficient total.")
+        return changed_records
+
     @staticmethod
     def redeem_prize(user_id, prize_id):
         """Redeem a prize with points, checking total points and deducting across stores."""
         with transaction.atomic():
             prize = get_object_or_404(Prize, id=prize_id)
             
-            # 1. Get user's total points across all stores
-            user_point_records = UserPoints.objects.filter(user_id=user_id)
-            total_user_points = user_point_records.aggregate(total=Sum('points'))['total'] or 0
+            # 1. Lock the user's point records so concurrent redemptions
+            # (or accruals) wait instead of spending the same points twice
+            user_point_records = list(
+                UserPoints.objects.select_for_update().filter(user_id=user_id).order_by('pk')
+            )
+            total_user_points = sum(record.points for record in user_point_records)
             
             # 2. Check if total points are sufficient
             if total_user_points < prize.points_required:
                 raise ValueError("Insufficient total points for redemption")
             
-            # 3. Deduct points across stores
-            points_to_deduct = prize.points_required
-            
-            # Prioritize deducting from the prize's store if it exists
-            if prize.store:
-                try:
-                    store_points_record = user_point_records.get(store=prize.store)
-                    deduct_from_this_store = min(store_points_record.points, points_to_deduct)
-                    store_points_record.points -= deduct_from_this_store
-                    store_points_record.save()
-                    points_to_deduct -= deduct_from_this_store
-                except UserPoints.DoesNotExist:
-                    pass # User has no points for this specific store, continue to others
-            
-            # Deduct remaining points from other stores (or all if prize has no store)
-            if points_to_deduct > 0:
-                # Order records to deduct consistently (e.g., highest points first)
-                other_point_records = user_point_records.exclude(store=prize.store).order_by('-points')
-                
-                for record in other_point_records:
-                    if points_to_deduct <= 0:
-                        break
-                    deduct_from_this_store = min(record.points, points_to_deduct)
-                    record.points -= deduct_from_this_store
-                    record.save()
-                    points_to_deduct -= deduct_from_this_store
-
-            # Ensure all points were deducted (shouldn't happen if total check passed, but good validation)
-            if points_to_deduct > 0:
-                 # This indicates a logic error or race condition, rollback transaction
-                 raise Exception("Failed to deduct all required points despite sufficient total.")
+            # 3. Deduct points across stores with a single UPDATE
+            changed_records = LoyaltyService._plan_points_deduction(
+                user_point_records, prize.store_id, prize.points_required
+            )
+            now = timezone.now()
+            for record in changed_records:
+                # bulk_update() skips auto_now
+                record.updated_at = now
+            UserPoints.objects.bulk_update(changed_records, ['points', 'updated_at'])
             
             # 4. Create redemption record
             redemption_data = {
@@ -249,118 +337,115 @@ class LoyaltyService:
         """Get user's prize redemption history"""
         return PrizeRedemption.objects.filter(user_id=user_id)
     
+    @staticmethod
+    def get_cart_store_diamonds(cart):
+        """Per-store rows for a cart's items: store id and name, the amount
+        spent in the store and its diamond count.
+
+        One grouped query, ordered by store id. Items without a store and
+        stores without diamonds are left out; a store's diamond count comes
+        from its first Diamond row.
+        """
+        first_diamond = Diamond.objects.filter(
+            store_id=OuterRef('product__store_id')
+        ).order_by('pk').values('quantity')[:1]
+
+        return CartItem.objects.filter(
+            cart=cart, product__store__isnull=False
+        ).values(
+            'product__store_id', 'product__store__name'
+        ).annotate(
+            amount=Sum(
+                F('quantity') * F('product__price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            diamond_count=Subquery(first_diamond)
+        ).filter(
+            diamond_count__isnull=False
+        ).order_by('product__store_id')
+
+    @staticmethod
+    def summarize_store_points(store_rows):
+        """Points preview for rows from get_cart_store_diamonds()"""
+        settings = LoyaltyService.get_global_settings()
+        
+        # Calculate points based on diamonds for each store
+        points_breakdown = []
+        total_points = 0
+        total_diamonds = 0
+        
+        for row in store_rows:
+            # Points are based on the number of diamonds the store has
+            diamond_count = row['diamond_count']
+            store_points = diamond_count * settings.diamond_points_value
+            
+            total_diamonds += diamond_count
+            total_points += store_points
+            
+            points_breakdown.append({
+                'store_id': row['product__store_id'],
+                'store_name': row['product__store__name'],
+                # Some backends return the SUM with a wider scale than the prices
+                'amount': row['amount'].quantize(Decimal('0.01')),
+                'diamond_count': diamond_count,
+                'points': store_points
+            })
+        
+        return {
+            'total_points': total_points,
+            'total_diamonds': total_diamonds,
+            'breakdown': points_breakdown
+        }
+
     @staticmethod
     def calculate_purchase_points(cart_id):
         """Calculate points to be earned from a purchase"""
         try:
             cart = get_object_or_404(ShoppingCart, id=cart_id)
-            settings = GlobalLoyaltySetting.get_settings()
-            
-            # Get the unique stores in the cart, skipping items with no store
-            stores_in_cart = set()
-            for item in cart.items.all():
-                if item.product and item.product.store:
-                    stores_in_cart.add(item.product.store.id)
-                # else: Product or its store is None, skip for points calculation
-            
-            # Calculate points based on diamonds for each store
-            points_breakdown = []
-            total_points = 0
-            total_diamonds = 0
-            
-            for store_id in stores_in_cart:
-                try:
-                    # Get the store
-                    store = Store.objects.get(id=store_id)
-                    
-                    # Get the store's diamonds
-                    diamond = Diamond.objects.filter(store_id=store_id).first()
-                    if diamond:
-                        # Calculate points based on the number of diamonds the store has
-                        diamond_count = diamond.quantity
-                        store_points = diamond_count * settings.diamond_points_value
-                        
-                        # Calculate the amount spent in this store for the breakdown
-                        store_amount = sum(
-                            item.quantity * item.product.price
-                            for item in cart.items.all()
-                            # Ensure product and store exist before checking ID
-                            if item.product and item.product.store and item.product.store.id == store_id
-                        )
-                        
-                        total_diamonds += diamond_count
-                        total_points += store_points
-                        
-                        points_breakdown.append({
-                            'store_id': store_id,
-                            'store_name': store.name,
-                            'amount': store_amount,
-                            'diamond_count': diamond_count,
-                            'points': store_points
-                        })
-                except Exception as e:
-                    print(f"Error calculating points for store {store_id}: {str(e)}")
-                    # Skip if any error occurs for a store
-                    continue
-            
-            return {
-                'total_points': total_points,
-                'total_diamonds': total_diamonds,
-                'breakdown': points_breakdown
-            }
+            return LoyaltyService.summarize_store_points(LoyaltyService.get_cart_store_diamonds(cart))
         except Exception as e:
             raise ValueError(f"Error calculating points: {str(e)}")
     
+    @staticmethod
+    def accrue_store_points(user_id, store_rows):
+        """Add the points earned in each store of get_cart_store_diamonds() rows"""
+        settings = LoyaltyService.get_global_settings()
+        points_by_store = {
+            row['product__store_id']: row['diamond_count'] * settings.diamond_points_value
+            for row in store_rows
+        }
+        
+        # Add these points to the user's accounts
+        totals = LoyaltyService.add_points_bulk(user_id, points_by_store)
+        
+        return [
+            {
+                'store_id': row['product__store_id'],
+                'store_name': row['product__store__name'],
+                'diamond_count': row['diamond_count'],
+                'points_added': points_by_store[row['product__store_id']],
+                'total_points': totals[row['product__store_id']]
+            }
+            for row in store_rows
+        ]
+
     @staticmethod
     def add_points_after_payment(payment_id):
         """Add points to user after successful payment"""
         try:
             payment = get_object_or_404(Payment, payment_id=payment_id, status=Payment.COMPLETED)
-            cart = payment.cart
-            user_id = payment.user.id
-            settings = GlobalLoyaltySetting.get_settings()
-            
-            # Get the unique stores in the cart
-            stores_in_cart = set()
-            for item in cart.items.all():
-                stores_in_cart.add(item.product.store.id)
-            
-            # Add points for each store based on their diamonds
-            points_added = []
-            for store_id in stores_in_cart:
-                try:
-                    # Get the store
-                    store = Store.objects.get(id=store_id)
-                    
-                    # Get the store's diamonds
-                    diamond = Diamond.objects.filter(store_id=store_id).first()
-                    if diamond:
-                        # Calculate points based on the number of diamonds the store has
-                        diamond_count = diamond.quantity
-                        store_points = diamond_count * settings.diamond_points_value
-                        
-                        # Add these points to the user's account
-                        user_points = LoyaltyService.add_points(user_id, store_id, store_points)
-                        
-                        points_added.append({
-                            'store_id': store_id,
-                            'store_name': store.name,
-                            'diamond_count': diamond_count,
-                            'points_added': store_points,
-                            'total_points': user_points.points
-                        })
-                except Exception as e:
-                    print(f"Error adding points for store {store_id}: {str(e)}")
-                    # Skip if any error occurs for a store
-                    continue
-            
-            return points_added
+            store_rows = list(LoyaltyService.get_cart_store_diamonds(payment.cart_id))
+            return LoyaltyService.accrue_store_points(payment.user_id, store_rows)
         except Exception as e:
             raise ValueError(f"Error adding points: {str(e)}")
     
     @staticmethod
-    def apply_discount_code(discount_code, cart_id):
-        """Apply a discount code to a cart"""
+    def apply_discount_code(discount_code, cart_id, breakdown=None):
+        """Apply a discount code to a cart.
+
+        Pass the cart's price breakdown when the caller already has one so
+        the cart is not priced a second time.
+        """
         try:
             # First, try to find a prize redemption discount code
             try:
@@ -372,10 +457,8 @@ class LoyaltyService:
                 if not redemption.prize.discount_percentage:
                     raise ValueError("Invalid prize discount code")
                 
-                cart = get_object_or_404(ShoppingCart, id=cart_id)
-                
                 # Calculate the discount amount using cart_total to account for store discounts
-                total_amount = CartService.get_cart_total(cart)
+                total_amount = LoyaltyService._get_cart_breakdown(cart_id, breakdown).total
                 # Log the calculation to help with debugging
                 logger.info(f"Prize discount calculation: Total amount (with any store discounts): {total_amount}, Prize discount percentage: {redemption.prize.discount_percentage}%")
                 # Convert integer to Decimal to avoid type mismatch
@@ -384,8 +467,9 @@ class LoyaltyService:
                 logger.info(f"Applied prize discount: {discount_amount}, Final amount: {total_amount - discount_amount}")
                 
                 # Mark redemption as used
-                redemption.used = True
-                redemption.save()
+                # Only one of several concurrent checkouts may spend the code
+                if not PrizeRedemption.objects.filter(pk=redemption.pk, used=False).update(used=True):
+                    raise ValueError("Discount code has already been used")
                 
                 return {
                     'original_amount': total_amount,
@@ -406,10 +490,8 @@ class LoyaltyService:
                 if discount.expiration_date and discount.expiration_date < timezone.now():
                     raise ValueError("Discount code has expired")
                 
-                cart = get_object_or_404(ShoppingCart, id=cart_id)
-                
                 # Calculate the discount amount using cart_total to account for store discounts
-                total_amount = CartService.get_cart_total(cart)
+                total_amount = LoyaltyService._get_cart_breakdown(cart_id, breakdown).total
                 # Log the calculation to help with debugging
                 logger.info(f"Discount calculation: Total amount (with any store discounts): {total_amount}, Discount percentage: {discount.value}%")
                 # Make sure we're working with Decimal objects for financial calculations
@@ -418,8 +500,9 @@ class LoyaltyService:
                 logger.info(f"Applied discount: {discount_amount}, Final amount: {total_amount - discount_amount}")
                 
                 # Mark discount as used
-                discount.used = True
-                discount.save()
+                # Only one of several concurrent checkouts may spend the code
+                if not DiscountCode.objects.filter(pk=discount.pk, used=False).update(used=True, updated_at=timezone.now()):
+                    raise ValueError("Discount code has already been used")
                 
                 return {
                     'original_amount': total_amount,
@@ -434,12 +517,20 @@ class LoyaltyService:
         except Exception as e:
             raise ValueError(f"Error applying discount: {str(e)}")
             
+    @staticmethod
+    def _get_cart_breakdown(cart_id, breakdown=None):
+        """Return the given breakdown for the cart, pricing the cart only if needed"""
+        if breakdown is not None and str(breakdown.cart_id) == str(cart_id):
+            return breakdown
+        cart = get_object_or_404(ShoppingCart, id=cart_id)
+        return CartPricingEngine.price_cart(cart)
+
     @staticmethod
     def get_store_points_conversion(store_id):
         """Get the points conversion rate for a store"""
         try:
             # Always return the global value
-            settings = GlobalLoyaltySetting.get_settings()
+            settings = LoyaltyService.get_global_settings()
             
             # We still accept store_id for potential future use or to maintain API structure,
             # but the returned value is the global one.
@@ -0,0 +1,175 @@
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from MallAPI.models.outbox_model import OutboxEvent
+from MallAPI.models.payment_model import Payment
+from MallAPI.services.delivery_services import DeliveryService
+from MallAPI.services.loyalty_services import LoyaltyService
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _assign_delivery(payload):
+    DeliveryService.assign_delivery(payload['payment_id'])
+
+def _accrue_points(payload):
+    payment = Payment.objects.get(id=payload['payment_id'], status=Payment.COMPLETED)
+    store_rows = list(LoyaltyService.get_cart_store_diamonds(payment.cart_id))
+    LoyaltyService.accrue_store_points(payment.user_id, store_rows)
+
+
+class OutboxService:
+    """Transactional outbox for side effects of a committed change.
+
+    Events are written with enqueue() inside the transaction that makes them
+    necessary, so they exist exactly when that transaction commits. The
+    process_outbox worker claims due events, runs each handler in its own
+    transaction together with marking the event done (so a handler's work
+    is never applied twice), and retries failures with exponential backoff.
+    Events that keep failing are parked as FAILED for inspection and can be
+    requeued; events held by a crashed worker are reclaimed after
+    LOCK_TIMEOUT.
+    """
+    HANDLERS = {
+        OutboxEvent.ASSIGN_DELIVERY: _assign_delivery,
+        OutboxEvent.ACCRUE_POINTS: _accrue_points,
+    }
+    MAX_ATTEMPTS = 8
+    RETRY_BASE_DELAY = 5  # seconds, doubled after every failed attempt
+    MAX_RETRY_DELAY = 60 * 60  # seconds
+    LOCK_TIMEOUT = 5 * 60  # seconds
+
+    @staticmethod
+    def get_worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def enqueue(events):
+        """Record (event_type, key, payload) events; call inside the causing transaction"""
+        OutboxEvent.objects.bulk_create(
+            [OutboxEvent(event_type=event_type, key=key, payload=payload) for event_type, key, payload in events],
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def get_payment_key(payment_id):
+        return f"payment:{payment_id}"
+
+    @classmethod
+    def enqueue_payment_events(cls, payment):
+        """Delivery assignment and loyalty accrual of a completed payment"""
+        key = cls.get_payment_key(payment.id)
+        payload = {'payment_id': payment.id}
+        cls.enqueue([
+            (OutboxEvent.ASSIGN_DELIVERY, key, payload),
+            (OutboxEvent.ACCRUE_POINTS, key, payload),
+        ])
+
+    @classmethod
+    def is_payment_event_pending(cls, event_type, payment_id):
+        """Whether the worker has yet to run (or retry) this event of a payment"""
+        return OutboxEvent.objects.filter(
+            event_type=event_type,
+            key=cls.get_payment_key(payment_id),
+            status__in=(OutboxEvent.PENDING, OutboxEvent.PROCESSING)
+        ).exists()
+
+    @classmethod
+    def claim_batch(cls, worker_id, limit):
+        """Mark up to `limit` due events as ours; returns their ids"""
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=cls.LOCK_TIMEOUT)
+        with transaction.atomic():
+            # Concurrent workers skip each other's rows instead of waiting
+            event_ids = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                    Q(status=OutboxEvent.PENDING, available_at__lte=now) |
+                    Q(status=OutboxEvent.PROCESSING, locked_at__lt=stale_before)
+                ).order_by('available_at', 'id').values_list('id', flat=True)[:limit]
+            )
+            OutboxEvent.objects.filter(id__in=event_ids).update(
+                status=OutboxEvent.PROCESSING,
+                locked_by=worker_id,
+                locked_at=now
+            )
+        return event_ids
+
+    @classmethod
+    def process_event(cls, event_id, worker_id):
+        """Run one claimed event; returns True if it completed"""
+        try:
+            with transaction.atomic():
+                event = OutboxEvent.objects.select_for_update().get(id=event_id)
+                if event.status != OutboxEvent.PROCESSING or event.locked_by != worker_id:
+                    # Reclaimed by another worker after our lock timed out
+                    return False
+
+                cls.HANDLERS[event.event_type](event.payload)
+
+                event.status = OutboxEvent.DONE
+                event.attempts += 1
+                event.last_error = ''
+                event.processed_at = timezone.now()
+                event.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+            return True
+        except Exception as e:
+            cls._record_failure(event_id, worker_id, e)
+            return False
+
+    @classmethod
+    def _record_failure(cls, event_id, worker_id, error):
+        with transaction.atomic():
+            event = OutboxEvent.objects.select_for_update().filter(
+                id=event_id, status=OutboxEvent.PROCESSING, locked_by=worker_id
+            ).first()
+            if event is None:
+                return
+
+            event.attempts += 1
+            event.last_error = str(error)
+            event.locked_by = ''
+            event.locked_at = None
+            if event.attempts >= cls.MAX_ATTEMPTS:
+                event.status = OutboxEvent.FAILED
+                logger.error(f"Outbox event {event} failed permanently: {str(error)}")
+            else:
+                delay = min(cls.RETRY_BASE_DELAY * 2 ** (event.attempts - 1), cls.MAX_RETRY_DELAY)
+                event.status = OutboxEvent.PENDING
+                event.available_at = timezone.now() + timedelta(seconds=delay)
+                logger.warning(f"Outbox event {event} failed, retrying in {delay}s: {str(error)}")
+            event.save(update_fields=['attempts', 'last_error', 'locked_by', 'locked_at', 'status', 'available_at'])
+
+    @classmethod
+    def _process_in_thread(cls, event_id, worker_id):
+        # Worker threads manage their own database connections
+        close_old_connections()
+        try:
+            return cls.process_event(event_id, worker_id)
+        finally:
+            close_old_connections()
+
+    @classmethod
+    def run_once(cls, executor, worker_id, batch_size=50):
+        """Claim and process one batch; returns (claimed, completed)"""
+        event_ids = cls.claim_batch(worker_id, batch_size)
+        if not event_ids:
+            return 0, 0
+        results = executor.map(lambda event_id: cls._process_in_thread(event_id, worker_id), event_ids)
+        return len(event_ids), sum(1 for completed in results if completed)
+
+    @staticmethod
+    def requeue_failed():
+        """Give permanently failed events a fresh set of attempts"""
+        return OutboxEvent.objects.filter(status=OutboxEvent.FAILED).update(
+            status=OutboxEvent.PENDING,
+            attempts=0,
+            available_at=timezone.now()
+        )
+
+    @staticmethod
+    def create_executor(workers):
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox')
@@ -2,14 +2,16 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from MallAPI.models.payment_model import Payment
-from MallAPI.services.cart_services import CartService
-from MallAPI.services.delivery_services import DeliveryService
-from MallAPI.services.loyalty_services import LoyaltyService
 
 class PayFlexService:
     @staticmethod
     def process_payment(user, cart, amount, card_details):
-        """Process payment through PayFlex"""
+        """Process payment through PayFlex.
+
+        Only charges the card and records the payment; CheckoutService runs
+        this inside the checkout transaction together with the cart
+        rollover and the outbox events for delivery and loyalty points.
+        """
         if not PayFlexService._validate_card(card_details):
             raise ValueError("Invalid card details")
         
@@ -21,23 +23,7 @@ class PayFlexService:
             payment_id=f"PF-{uuid.uuid4().hex[:8].upper()}",
             status=Payment.COMPLETED
         )
-        
         print(f"Payment created: {payment.payment_id}")  # Debug log
-        
-        # After successful payment, create delivery order
-        try:
-            delivery_order = DeliveryService.assign_delivery(payment.id)
-            print(f"Delivery order created: {delivery_order.id}")  # Debug log
-        except Exception as e:
-            print(f"Error assigning delivery: {str(e)}")
-        
-        # Add loyalty points for the purchase
-        try:
-            points_added = LoyaltyService.add_points_after_payment(payment.payment_id)
-            print(f"Loyalty points added: {points_added}")  # Debug log
-        except Exception as e:
-            print(f"Error adding loyalty points: {str(e)}")
-            
         return payment
 
     @staticmethod
@@ -0,0 +1,117 @@
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery
+from MallAPI.models.store_model import Product, ProductRating, ProductInteraction, Favorite
+from MallAPI.serializers.store_serializers import ProductListSerializer
+from MallAPI.services.cache_services import CacheGenerationService, build_cache_key
+from MallAPI.services.product_stats_services import ProductStatsService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ProductDetailService:
+    """Read-through cache for product detail pages.
+
+    The part of the payload shared by every visitor (product, store,
+    category, discounted price, average rating) is cached per product. Its
+    key embeds the product's own cache generation, bumped on product and
+    rating changes; the store and category generations it was built under
+    are stored with the entry and checked on read, since the product id
+    alone does not tell us its store. Per-user fields are fetched with one
+    small query and merged on top.
+    """
+    CACHE_TTL = 60 * 60  # seconds
+
+    @staticmethod
+    def product_namespace(product_id):
+        return f"product_{product_id}"
+
+    @staticmethod
+    def store_namespace(store_id):
+        return f"store_{store_id}"
+
+    @classmethod
+    def _dependency_namespaces(cls, store_id):
+        namespaces = ['categories']
+        if store_id:
+            namespaces.append(cls.store_namespace(store_id))
+        return namespaces
+
+    @classmethod
+    def get_shared_payload(cls, product_id, request):
+        """{'product': ..., 'store': ..., 'category_id': ..., 'store_id': ...}
+
+        Raises Product.DoesNotExist for unknown products.
+        """
+        generation = CacheGenerationService.get_generation(cls.product_namespace(product_id))
+        cache_key = build_cache_key(
+            f"product_detail_{product_id}_{generation}",
+            # Image URLs are absolute
+            scheme=request.scheme,
+            host=request.get_host()
+        )
+
+        entry = cache.get(cache_key)
+        if entry is not None:
+            namespaces = cls._dependency_namespaces(entry['store_id'])
+            if CacheGenerationService.get_generations(namespaces) == entry['versions']:
+                return entry
+
+        # Read the dependency generations before the data so a concurrent
+        # change can only make the entry look stale, never fresh
+        product = Product.objects.only('store_id').get(id=product_id)
+        namespaces = cls._dependency_namespaces(product.store_id)
+        versions = CacheGenerationService.get_generations(namespaces)
+
+        product = Product.objects.select_related('store__discount', 'category', 'stats').get(id=product_id)
+        product_stats = ProductStatsService.get_stats(product)
+        serializer = ProductListSerializer(product, context={
+            'request': request,
+            'average_rating': product_stats.average_rating,
+            'user_rating': None
+        })
+        entry = {
+            'product': serializer.data,
+            'store': {
+                'id': product.store.id,
+                'name': product.store.name
+            } if product.store else None,
+            'store_id': product.store_id,
+            'category_id': product.category.id if product.category else None,
+            'generation': generation,
+            'versions': versions,
+        }
+        cache.set(cache_key, entry, cls.CACHE_TTL)
+        return entry
+
+    @staticmethod
+    def get_user_fields(user, product_id):
+        """The current user's rating, favorite flag and like/dislike, in one query"""
+        if not user.is_authenticated:
+            return {'user_rating': None, 'is_favorited': False, 'user_interaction': None}
+
+        fields = Product.objects.filter(id=product_id).annotate(
+            user_rating=Subquery(
+                ProductRating.objects.filter(product=OuterRef('pk'), user=user).values('rating')[:1]
+            ),
+            is_favorited=Exists(Favorite.objects.filter(product=OuterRef('pk'), user=user)),
+            user_interaction=Subquery(
+                ProductInteraction.objects.filter(product=OuterRef('pk'), user=user).values('interaction_type')[:1]
+            ),
+        ).values('user_rating', 'is_favorited', 'user_interaction').first()
+
+        fields = fields or {'user_rating': None, 'is_favorited': False, 'user_interaction': None}
+        # Only customers can rate
+        if user.role != 'CUSTOMER':
+            fields['user_rating'] = None
+        return fields
+
+    @classmethod
+    def get_request_user_fields(cls, request, product_id):
+        """get_user_fields() for the request's user, queried once per request
+        (the ETag validator and the view both need them)"""
+        memo = getattr(request, '_product_user_fields', None)
+        if memo is None:
+            memo = request._product_user_fields = {}
+        if product_id not in memo:
+            memo[product_id] = cls.get_user_fields(request.user, product_id)
+        return memo[product_id]
@@ -0,0 +1,123 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from MallAPI.models.store_model import (
+    Product, ProductStats, ProductRating, ProductInteraction, ProductComment, Favorite
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ProductStatsService:
+    INTERACTION_COUNTERS = {
+        ProductInteraction.LIKE: 'likes_count',
+        ProductInteraction.DISLIKE: 'dislikes_count',
+    }
+
+    @staticmethod
+    def _count_subquery(queryset, aggregate):
+        return Coalesce(
+            Subquery(
+                queryset.filter(product=OuterRef('pk')).values('product').annotate(total=aggregate).values('total')
+            ),
+            Value(0)
+        )
+
+    @classmethod
+    def annotate_actual_counts(cls, products):
+        """Annotate products with counters computed from the source tables"""
+        return products.annotate(
+            actual_rating_sum=cls._count_subquery(ProductRating.objects.all(), Sum('rating')),
+            actual_rating_count=cls._count_subquery(ProductRating.objects.all(), Count('id')),
+            actual_likes_count=cls._count_subquery(
+                ProductInteraction.objects.filter(interaction_type=ProductInteraction.LIKE), Count('id')
+            ),
+            actual_dislikes_count=cls._count_subquery(
+                ProductInteraction.objects.filter(interaction_type=ProductInteraction.DISLIKE), Count('id')
+            ),
+            actual_comments_count=cls._count_subquery(ProductComment.objects.all(), Count('id')),
+            actual_favorites_count=cls._count_subquery(Favorite.objects.all(), Count('id')),
+        )
+
+    @classmethod
+    def recompute(cls, product_id):
+        """Rebuild a product's stats row from the source tables"""
+        product = cls.annotate_actual_counts(Product.objects.filter(id=product_id)).first()
+        if product is None:
+            return None
+        values = {field: getattr(product, f'actual_{field}') for field in ProductStats.COUNTER_FIELDS}
+        try:
+            with transaction.atomic():
+                stats, _ = ProductStats.objects.update_or_create(product_id=product_id, defaults=values)
+        except IntegrityError:
+            # Created concurrently; the other writer's row already has the same data
+            stats = ProductStats.objects.get(product_id=product_id)
+        return stats
+
+    @classmethod
+    def adjust(cls, product_id, **deltas):
+        """Apply counter deltas after a write, e.g. adjust(id, likes_count=1).
+
+        Call this in the same transaction as the write, after it. A missing
+        stats row is rebuilt from the source tables, which already include
+        the write.
+        """
+        updates = {
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items()
+            if delta
+        }
+        if not updates:
+            return
+        # QuerySet.update() skips auto_now
+        updates['updated_at'] = timezone.now()
+        if not ProductStats.objects.filter(product_id=product_id).update(**updates):
+            cls.recompute(product_id)
+
+    @classmethod
+    def get_stats(cls, product):
+        """The product's stats row, building it on first access"""
+        try:
+            return product.stats
+        except ProductStats.DoesNotExist:
+            return cls.recompute(product.id)
+
+    @classmethod
+    def reconcile(cls, batch_size=500):
+        """Fix drifted or missing stats rows; returns (checked, created, updated)"""
+        checked = created = updated = 0
+        products = cls.annotate_actual_counts(Product.objects.all()).order_by('id')
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                created, updated = cls._reconcile_batch(batch, created, updated)
+                checked += len(batch)
+                batch = []
+        if batch:
+            created, updated = cls._reconcile_batch(batch, created, updated)
+            checked += len(batch)
+        return checked, created, updated
+
+    @classmethod
+    def _reconcile_batch(cls, products, created, updated):
+        existing = ProductStats.objects.in_bulk([product.id for product in products])
+        to_create, to_update = [], []
+        for product in products:
+            actual = {field: getattr(product, f'actual_{field}') for field in ProductStats.COUNTER_FIELDS}
+            stats = existing.get(product.id)
+            if stats is None:
+                to_create.append(ProductStats(product_id=product.id, **actual))
+            elif any(getattr(stats, field) != value for field, value in actual.items()):
+                for field, value in actual.items():
+                    setattr(stats, field, value)
+                stats.updated_at = timezone.now()
+                to_update.append(stats)
+
+        with transaction.atomic():
+            ProductStats.objects.bulk_create(to_create, ignore_conflicts=True)
+            ProductStats.objects.bulk_update(to_update, ProductStats.COUNTER_FIELDS + ['updated_at'])
+        if to_update:
+            logger.info(f"Reconciled drifted stats for products {[stats.product_id for stats in to_update]}")
+        return created + len(to_create), updated + len(to_update)
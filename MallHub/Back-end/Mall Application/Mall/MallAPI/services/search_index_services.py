@@ -0,0 +1,159 @@
+import re
+from functools import reduce
+from operator import add
+from django.db import transaction
+from django.db.models import Q, Sum, Max, Case, When, Value, IntegerField, OuterRef, Subquery
+from MallAPI.models.search_model import SearchIndexEntry
+from MallAPI.models.store_model import Store, Product, Category
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SearchIndexService:
+    """Inverted index over product, store and category text.
+
+    Each indexed object is split into lower-cased word terms stored in
+    SearchIndexEntry with a weight per field. A search matches objects for
+    which every query word is a prefix of one of their terms and ranks them
+    by the summed weight of the matching terms, using only index seeks on
+    (entity_type, term) instead of scanning the catalog.
+    """
+    NAME_WEIGHT = 3
+    RELATED_NAME_WEIGHT = 2  # category / section names a store is listed under
+    DESCRIPTION_WEIGHT = 1
+    MAX_TERM_LENGTH = 64
+    MAX_QUERY_TERMS = 8
+    BATCH_SIZE = 500
+
+    TOKEN_PATTERN = re.compile(r'\w+')
+
+    @classmethod
+    def tokenize(cls, text):
+        if not text:
+            return []
+        return [token[:cls.MAX_TERM_LENGTH] for token in cls.TOKEN_PATTERN.findall(str(text).lower())]
+
+    @classmethod
+    def _weigh_terms(cls, weighted_texts):
+        terms = {}
+        for text, weight in weighted_texts:
+            for term in cls.tokenize(text):
+                terms[term] = terms.get(term, 0) + weight
+        return terms
+
+    @classmethod
+    def get_product_terms(cls, product):
+        return cls._weigh_terms([
+            (product.name, cls.NAME_WEIGHT),
+            (product.description, cls.DESCRIPTION_WEIGHT),
+        ])
+
+    @classmethod
+    def get_store_terms(cls, store):
+        weighted_texts = [
+            (store.name, cls.NAME_WEIGHT),
+            (store.description, cls.DESCRIPTION_WEIGHT),
+        ]
+        weighted_texts += [(category.name, cls.RELATED_NAME_WEIGHT) for category in store.categories.all()]
+        if store.section_id:
+            weighted_texts.append((store.section.name, cls.RELATED_NAME_WEIGHT))
+        return cls._weigh_terms(weighted_texts)
+
+    @classmethod
+    def get_category_terms(cls, category):
+        return cls._weigh_terms([
+            (category.name, cls.NAME_WEIGHT),
+            (category.description, cls.DESCRIPTION_WEIGHT),
+        ])
+
+    @classmethod
+    def _build_entries(cls, entity_type, object_id, terms):
+        return [
+            SearchIndexEntry(term=term, entity_type=entity_type, object_id=object_id, weight=weight)
+            for term, weight in terms.items()
+        ]
+
+    @classmethod
+    def _replace_entries(cls, entity_type, object_id, terms):
+        with transaction.atomic():
+            SearchIndexEntry.objects.filter(entity_type=entity_type, object_id=object_id).delete()
+            SearchIndexEntry.objects.bulk_create(cls._build_entries(entity_type, object_id, terms))
+
+    @classmethod
+    def index_product(cls, product):
+        cls._replace_entries(SearchIndexEntry.PRODUCT, product.id, cls.get_product_terms(product))
+
+    @classmethod
+    def index_store(cls, store):
+        cls._replace_entries(SearchIndexEntry.STORE, store.id, cls.get_store_terms(store))
+
+    @classmethod
+    def index_category(cls, category):
+        cls._replace_entries(SearchIndexEntry.CATEGORY, category.id, cls.get_category_terms(category))
+
+    @staticmethod
+    def remove_object(entity_type, object_id):
+        SearchIndexEntry.objects.filter(entity_type=entity_type, object_id=object_id).delete()
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuild the whole index; returns the number of objects indexed per type"""
+        sources = [
+            (SearchIndexEntry.PRODUCT, Product.objects.all(), cls.get_product_terms),
+            (SearchIndexEntry.STORE, Store.objects.select_related('section').prefetch_related('categories'), cls.get_store_terms),
+            (SearchIndexEntry.CATEGORY, Category.objects.all(), cls.get_category_terms),
+        ]
+        counts = {}
+        with transaction.atomic():
+            SearchIndexEntry.objects.all().delete()
+            for entity_type, queryset, get_terms in sources:
+                entries, indexed = [], 0
+                for obj in queryset.order_by('id').iterator(chunk_size=cls.BATCH_SIZE):
+                    entries += cls._build_entries(entity_type, obj.id, get_terms(obj))
+                    indexed += 1
+                    if len(entries) >= cls.BATCH_SIZE:
+                        SearchIndexEntry.objects.bulk_create(entries)
+                        entries = []
+                SearchIndexEntry.objects.bulk_create(entries)
+                counts[entity_type] = indexed
+        return counts
+
+    @classmethod
+    def get_query_terms(cls, query):
+        # Unique query words, in order, capped to keep the match query bounded
+        return list(dict.fromkeys(cls.tokenize(query)))[:cls.MAX_QUERY_TERMS]
+
+    @classmethod
+    def _matching_entries(cls, entity_type, query_terms):
+        """object_id / score rows for objects whose terms cover every query word"""
+        prefix_filter = reduce(lambda q, term: q | Q(term__startswith=term),
+                               query_terms, Q())
+        matched_terms = reduce(add, [
+            Max(Case(When(term__startswith=term, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for term in query_terms
+        ])
+        return SearchIndexEntry.objects.filter(
+            prefix_filter, entity_type=entity_type
+        ).values('object_id').annotate(
+            score=Sum('weight'),
+            matched_terms=matched_terms
+        ).filter(matched_terms=len(query_terms))
+
+    @classmethod
+    def apply_search(cls, queryset, entity_type, query):
+        """Filter a queryset to the objects matching `query`.
+
+        Matching objects are annotated with `search_rank`; order by
+        '-search_rank' for relevance ordering. A query without any word
+        characters matches nothing.
+        """
+        query_terms = cls.get_query_terms(query)
+        if not query_terms:
+            return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+        matches = cls._matching_entries(entity_type, query_terms)
+        return queryset.filter(
+            pk__in=matches.values('object_id')
+        ).annotate(
+            search_rank=Subquery(matches.filter(object_id=OuterRef('pk')).values('score')[:1])
+        )
@@ -1,7 +1,10 @@
 from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage
-from django.db.models import Q
-from MallAPI.models.store_model import Store, Product, Category, StoreDiscount
+from django.db.models import Exists, OuterRef, Value, BooleanField, Count
+from MallAPI.models.store_model import Store, Product, Category, StoreDiscount, Favorite, ProductComment, CommentInteraction
+from MallAPI.models.search_model import SearchIndexEntry
+from MallAPI.services.search_index_services import SearchIndexService
+from MallAPI.services.cache_services import CacheGenerationService, CacheCounterService, build_cache_key
 from django.conf import settings
 import logging 
 
@@ -70,6 +73,29 @@ class StoreService:
         except Exception:
             return None
 
+    @staticmethod
+    def annotate_product_listing(products, request):
+        """Prepare a product queryset for ProductWithStoreSerializer.
+
+        Joins the store and its discount, annotates whether the current user
+        favorited each product and prefetches store diamonds when requested,
+        so serializing a page costs a fixed number of queries.
+        """
+        products = products.select_related('store__discount')
+
+        user = request.user
+        if user.is_authenticated:
+            products = products.annotate(
+                is_favorited=Exists(Favorite.objects.filter(user=user, product=OuterRef('pk')))
+            )
+        else:
+            products = products.annotate(is_favorited=Value(False, output_field=BooleanField()))
+
+        if request.query_params.get('include_store_diamonds', 'false').lower() == 'true':
+            products = products.prefetch_related('store__diamonds')
+
+        return products
+
     @classmethod
     def get_store_products(cls, store_id, page=1, per_page=None):
         try:
@@ -134,18 +160,102 @@ class StoreService:
             'has_previous': paginated_categories.has_previous(),
         }
 
+class CommentService:
+    @staticmethod
+    def annotate_comments(comments, user):
+        """Annotate like counts and whether the given user liked each comment"""
+        comments = comments.select_related('user').annotate(likes_count=Count('interactions'))
+        if user.is_authenticated:
+            return comments.annotate(
+                user_liked=Exists(CommentInteraction.objects.filter(user=user, comment=OuterRef('pk')))
+            )
+        return comments.annotate(user_liked=Value(False, output_field=BooleanField()))
+
+    @classmethod
+    def load_reply_tree(cls, root_comments, user):
+        """Attach the full reply tree to each of the given comments.
+
+        Replies are fetched one nesting level at a time for all roots together,
+        so the cost depends on the thread depth rather than the number of
+        comments. Each comment gets a `loaded_replies` list that
+        ProductCommentSerializer reads instead of querying.
+        """
+        root_comments = list(root_comments)
+        level = root_comments
+        while level:
+            by_id = {comment.id: comment for comment in level}
+            for comment in level:
+                comment.loaded_replies = []
+
+            replies = list(cls.annotate_comments(
+                ProductComment.objects.filter(parent_id__in=by_id.keys()), user
+            ).order_by('created_at', 'id'))
+            for reply in replies:
+                by_id[reply.parent_id].loaded_replies.append(reply)
+            level = replies
+        return root_comments
+
 class SearchService:
-    CACHE_TTL = 3600  # Cache timeout in seconds (1 hour)
+    CACHE_TTL = 60 * 60 * 24  # Cache timeout in seconds (1 day); writes invalidate via generations
     RESULTS_PER_PAGE = 10
 
-    @staticmethod
-    def _get_cache_key(query_type, query, page=1):
-        return f"search_{query_type}_{query}_{page}"
+    # Generation namespaces each result type depends on. Product results
+    # include store and category names, so renaming those invalidates them too.
+    CACHE_NAMESPACES = {
+        'products': ('products', 'stores', 'categories'),
+        'stores': ('stores',),
+        'category': ('products', 'stores', 'categories'),
+    }
 
     @classmethod
-    def search_products(cls, query, page=1, category_id=None):
-        cache_key = cls._get_cache_key('products', f"{query}_{category_id}", page)
+    def _get_cache_key(cls, query_type, page=1, **filters):
+        generations = CacheGenerationService.get_generations(cls.CACHE_NAMESPACES[query_type])
+        version = '_'.join(str(generation) for generation in generations)
+        return build_cache_key(
+            f"search_{query_type}_{version}",
+            page=page,
+            per_page=cls.RESULTS_PER_PAGE,
+            **filters
+        )
+
+    @classmethod
+    def _get_cached_results(cls, query_type, cache_key):
         results = cache.get(cache_key)
+        CacheCounterService.incr(f"search_{query_type}_{'hits' if results is not None else 'misses'}")
+        return results
+
+    @classmethod
+    def _get_stats_counter_names(cls):
+        return [
+            f"search_{query_type}_{outcome}"
+            for query_type in cls.CACHE_NAMESPACES
+            for outcome in ('hits', 'misses')
+        ]
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Hit/miss counters per result type since the last reset"""
+        counts = CacheCounterService.get_counts(cls._get_stats_counter_names())
+        stats = {}
+        for query_type in cls.CACHE_NAMESPACES:
+            hits = counts[f"search_{query_type}_hits"]
+            misses = counts[f"search_{query_type}_misses"]
+            total = hits + misses
+            stats[query_type] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / total, 4) if total else None,
+            }
+        return stats
+
+    @classmethod
+    def reset_cache_stats(cls):
+        CacheCounterService.reset(cls._get_stats_counter_names())
+
+    @classmethod
+    def search_products(cls, query, page=1, category_id=None):
+        cache_key = cls._get_cache_key('products', page, query=query, category_id=category_id)
+        results = cls._get_cached_results('products', cache_key)
 
         if results is None:
             products = Product.objects.select_related('store', 'category').filter(is_active=True)
@@ -154,10 +264,9 @@ class SearchService:
                 products = products.filter(category_id=category_id)
             
             if query:
-                products = products.filter(
-                    Q(name__icontains=query) |
-                    Q(description__icontains=query)
-                )
+                products = SearchIndexService.apply_search(
+                    products, SearchIndexEntry.PRODUCT, query
+                ).order_by('-search_rank', 'id')
 
             paginator = Paginator(products, cls.RESULTS_PER_PAGE)
             results = {
@@ -178,8 +287,8 @@ class SearchService:
 
     @classmethod
     def search_stores(cls, query, page=1, category_id=None):
-        cache_key = cls._get_cache_key('stores', f"{query}_{category_id}", page)
-        results = cache.get(cache_key)
+        cache_key = cls._get_cache_key('stores', page, query=query, category_id=category_id)
+        results = cls._get_cached_results('stores', cache_key)
 
         if results is None:
             stores = Store.objects.all()
@@ -188,10 +297,9 @@ class SearchService:
                 stores = stores.filter(categories__id=category_id)
             
             if query:
-                stores = stores.filter(
-                    Q(name__icontains=query) |
-                    Q(description__icontains=query)
-                )
+                stores = SearchIndexService.apply_search(
+                    stores, SearchIndexEntry.STORE, query
+                ).order_by('-search_rank', 'id')
 
             paginator = Paginator(stores.distinct(), cls.RESULTS_PER_PAGE)
             results = {
@@ -211,22 +319,23 @@ class SearchService:
 
     @classmethod
     def get_category_items(cls, category_id, item_type='all', page=1):
-        cache_key = cls._get_cache_key('category', f"{category_id}_{item_type}", page)
-        results = cache.get(cache_key)
+        if item_type not in ('products', 'stores'):
+            # Return both products and stores
+            return {
+                'products': cls.get_category_items(category_id, 'products', page),
+                'stores': cls.get_category_items(category_id, 'stores', page)
+            }
+
+        cache_key = cls._get_cache_key('category', page, category_id=category_id, item_type=item_type)
+        results = cls._get_cached_results('category', cache_key)
 
         if results is None:
             if item_type == 'products':
                 items = Product.objects.filter(category_id=category_id)
                 values_to_get = ['id', 'name', 'description', 'price', 'store__name']
-            elif item_type == 'stores':
+            else:
                 items = Store.objects.filter(categories__id=category_id)
                 values_to_get = ['id', 'name', 'description', 'logo']
-            else:
-                # Return both products and stores
-                return {
-                    'products': cls.get_category_items(category_id, 'products', page),
-                    'stores': cls.get_category_items(category_id, 'stores', page)
-                }
 
             paginator = Paginator(items.distinct(), cls.RESULTS_PER_PAGE)
             results = {
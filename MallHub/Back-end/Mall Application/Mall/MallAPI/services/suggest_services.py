@@ -0,0 +1,313 @@
+import threading
+import time
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models.functions import Length
+from MallAPI.models.search_model import SearchIndexEntry
+from MallAPI.models.store_model import Store, Product, Category
+from MallAPI.services.cache_services import CacheGenerationService
+from MallAPI.services.search_index_services import SearchIndexService
+import logging
+
+logger = logging.getLogger(__name__)
+
+def normalize_label(text):
+    return ' '.join(str(text or '').casefold().split())
+
+
+class PrefixTrie:
+    """Character trie of names, answering "names with a word starting with X".
+
+    Each name is inserted once per word start, so "Red phone case" is found
+    by "red", "pho" or "cas". Every node keeps the ids of the names below it
+    and caches its best `max_results` ids (shortest names first); the cache
+    is refreshed lazily after a removal.
+
+    To bound memory only the first MAX_WORD_STARTS words of a name and the
+    first MAX_INDEXED_DEPTH characters after each word start are indexed,
+    so a name occupies at most MAX_WORD_STARTS * MAX_INDEXED_DEPTH nodes.
+    Longer queries filter the names under the deepest indexed node.
+    """
+    MAX_INDEXED_DEPTH = 12
+    MAX_WORD_STARTS = 8
+
+    def __init__(self, max_results):
+        self.max_results = max_results
+        self.labels = {}  # object id -> display name
+        self.root = self._new_node()
+
+    @staticmethod
+    def _new_node():
+        return {'children': {}, 'ids': set(), 'top': []}
+
+    def _sort_key(self, object_id):
+        label = self.labels[object_id]
+        return (len(label), label.casefold(), object_id)
+
+    def _word_suffixes(self, label):
+        normalized = normalize_label(label)
+        starts = [0] + [index + 1 for index, char in enumerate(normalized) if char == ' ']
+        return [normalized[start:] for start in starts[:self.MAX_WORD_STARTS]]
+
+    def _paths(self, label):
+        return {suffix[:self.MAX_INDEXED_DEPTH] for suffix in self._word_suffixes(label)}
+
+    def insert(self, object_id, label):
+        if object_id in self.labels:
+            self.remove(object_id)
+        self.labels[object_id] = label
+
+        for path in self._paths(label):
+            node = self.root
+            for char in path:
+                node = node['children'].setdefault(char, self._new_node())
+                node['ids'].add(object_id)
+                if node['top'] is not None:
+                    top = node['top'] + [object_id]
+                    top.sort(key=self._sort_key)
+                    node['top'] = top[:self.max_results]
+
+    def remove(self, object_id):
+        label = self.labels.get(object_id)
+        if label is None:
+            return
+
+        for path in self._paths(label):
+            node = self.root
+            for char in path:
+                child = node['children'].get(char)
+                if child is None:
+                    break
+                child['ids'].discard(object_id)
+                if not child['ids']:
+                    # Nothing left below this point
+                    del node['children'][char]
+                    break
+                if object_id in (child['top'] or []):
+                    child['top'] = None
+                node = child
+        del self.labels[object_id]
+
+    def search(self, prefix, limit):
+        normalized = normalize_label(prefix)
+        node = self.root
+        for char in normalized[:self.MAX_INDEXED_DEPTH]:
+            node = node['children'].get(char)
+            if node is None:
+                return []
+        if node is self.root:
+            return []
+
+        if len(normalized) > self.MAX_INDEXED_DEPTH:
+            object_ids = sorted(
+                (
+                    object_id for object_id in node['ids']
+                    if any(suffix.startswith(normalized) for suffix in self._word_suffixes(self.labels[object_id]))
+                ),
+                key=self._sort_key
+            )[:limit]
+            return [(object_id, self.labels[object_id]) for object_id in object_ids]
+
+        if node['top'] is None:
+            node['top'] = sorted(node['ids'], key=self._sort_key)[:self.max_results]
+        return [(object_id, self.labels[object_id]) for object_id in node['top'][:limit]]
+
+
+class SuggestionService:
+    """In-process type-ahead over product, store and category names.
+
+    Each worker keeps its own tries. Once a catalog change commits, the
+    worker that made it bumps the 'suggestions' cache generation and stores
+    the change, (type, id, label or None for a removal), in the cache under
+    the new generation. Other workers notice the new generation (checked at
+    most once per GENERATION_CHECK_INTERVAL) and replay the changes they
+    missed in order. Only when a change is no longer in the cache, or a
+    worker is more than MAX_DELTA_CATCHUP changes behind, is the index
+    reloaded from the database; that happens in a background thread while
+    the current tries keep answering. A worker's first load runs in the
+    background too; until it finishes, suggestions come from the
+    SearchIndexEntry table instead.
+    """
+    MAX_RESULTS = 10
+    GENERATION_CHECK_INTERVAL = 1.0  # seconds
+    NAMESPACE = 'suggestions'
+    DELTA_KEY_PREFIX = 'suggestion_delta'
+    DELTA_TTL = 60 * 60  # seconds
+    MAX_DELTA_CATCHUP = 500
+    FALLBACK_CANDIDATES = 200
+    ENTITY_TYPES = (SearchIndexEntry.CATEGORY, SearchIndexEntry.STORE, SearchIndexEntry.PRODUCT)
+
+    _tries = None
+    _generation = None
+    _checked_at = 0.0
+    _reloading = False
+    _lock = threading.RLock()
+
+    @classmethod
+    def _get_delta_key(cls, generation):
+        return f"{cls.DELTA_KEY_PREFIX}_{generation}"
+
+    @staticmethod
+    def _get_sources():
+        return {
+            SearchIndexEntry.CATEGORY: Category.objects.all(),
+            SearchIndexEntry.STORE: Store.objects.all(),
+            SearchIndexEntry.PRODUCT: Product.objects.filter(is_active=True),
+        }
+
+    @classmethod
+    def _load_tries(cls):
+        tries = {}
+        for entity_type, queryset in cls._get_sources().items():
+            trie = PrefixTrie(cls.MAX_RESULTS)
+            for object_id, name in queryset.values_list('id', 'name').iterator():
+                trie.insert(object_id, name)
+            tries[entity_type] = trie
+        return tries
+
+    @classmethod
+    def rebuild(cls):
+        """Load the tries from the database and swap them in"""
+        # Read the generation first: changes committed while loading are
+        # replayed on top by the next check
+        generation = CacheGenerationService.get_generation(cls.NAMESPACE)
+        tries = cls._load_tries()
+        with cls._lock:
+            cls._tries = tries
+            cls._generation = generation
+            cls._checked_at = 0.0
+        logger.info(f"Rebuilt suggestion index at generation {generation}")
+
+    @classmethod
+    def _rebuild_in_background(cls):
+        # The thread manages its own database connection
+        close_old_connections()
+        try:
+            cls.rebuild()
+        except Exception as e:
+            logger.error(f"Error rebuilding suggestion index: {str(e)}")
+        finally:
+            with cls._lock:
+                cls._reloading = False
+            close_old_connections()
+
+    @staticmethod
+    def _apply(tries, change):
+        entity_type, object_id, label = change
+        if label is None:
+            tries[entity_type].remove(object_id)
+        else:
+            tries[entity_type].insert(object_id, label)
+
+    @classmethod
+    def _catch_up(cls, generation):
+        """Replay the changes up to `generation`; False if any is unavailable"""
+        missed = generation - cls._generation
+        if not 0 < missed <= cls.MAX_DELTA_CATCHUP:
+            return False
+        keys = [cls._get_delta_key(cls._generation + offset) for offset in range(1, missed + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        for key in keys:
+            cls._apply(cls._tries, changes[key])
+        cls._generation = generation
+        return True
+
+    @classmethod
+    def _ensure_current(cls):
+        now = time.monotonic()
+        if cls._tries is not None and now - cls._checked_at < cls.GENERATION_CHECK_INTERVAL:
+            return
+
+        with cls._lock:
+            if cls._reloading:
+                return
+            if cls._tries is not None:
+                if now - cls._checked_at < cls.GENERATION_CHECK_INTERVAL:
+                    return
+                cls._checked_at = now
+
+                generation = CacheGenerationService.get_generation(cls.NAMESPACE)
+                if generation == cls._generation or cls._catch_up(generation):
+                    return
+            # First use, or too far behind: load in the background
+            cls._reloading = True
+        threading.Thread(target=cls._rebuild_in_background, name='suggestion-rebuild', daemon=True).start()
+
+    @classmethod
+    def _search_index(cls, entity_type, query, limit):
+        """Suggestions straight from SearchIndexEntry, used until the tries are loaded"""
+        query_terms = SearchIndexService.get_query_terms(query)
+        if not query_terms:
+            return []
+        object_ids = SearchIndexEntry.objects.filter(
+            entity_type=entity_type, term__startswith=query_terms[0]
+        ).values('object_id')
+        candidates = cls._get_sources()[entity_type].filter(
+            id__in=object_ids
+        ).order_by(Length('name'), 'name', 'id').values_list('id', 'name')[:cls.FALLBACK_CANDIDATES]
+
+        # The first query word may only match a description; keep the names that match
+        trie = PrefixTrie(limit)
+        for object_id, name in candidates:
+            trie.insert(object_id, name)
+        return trie.search(query, limit)
+
+    @classmethod
+    def suggest(cls, query, limit=MAX_RESULTS, entity_type=None):
+        """Up to `limit` names with a word starting with `query`, shortest first"""
+        if not normalize_label(query):
+            return []
+        limit = max(1, min(limit, cls.MAX_RESULTS))
+        cls._ensure_current()
+
+        entity_types = [entity_type] if entity_type else cls.ENTITY_TYPES
+        with cls._lock:
+            tries = cls._tries
+            if tries is not None:
+                matches = [
+                    (len(label), label.casefold(), entity_type, object_id, label)
+                    for entity_type in entity_types
+                    for object_id, label in tries[entity_type].search(query, limit)
+                ]
+        if tries is None:
+            # The first load is still running; don't wait for it
+            matches = [
+                (len(label), label.casefold(), entity_type, object_id, label)
+                for entity_type in entity_types
+                for object_id, label in cls._search_index(entity_type, query, limit)
+            ]
+        matches.sort()
+        return [
+            {'type': entity_type, 'id': object_id, 'label': label}
+            for _, _, entity_type, object_id, label in matches[:limit]
+        ]
+
+    @classmethod
+    def _publish(cls, change):
+        generation = CacheGenerationService.bump(cls.NAMESPACE)
+        if generation is not None:
+            cache.set(cls._get_delta_key(generation), change, cls.DELTA_TTL)
+
+        with cls._lock:
+            if cls._tries is None:
+                return
+            if generation is None:
+                # Other workers only see this change after their next reload
+                cls._apply(cls._tries, change)
+            elif cls._generation == generation - 1:
+                cls._apply(cls._tries, change)
+                cls._generation = generation
+            else:
+                # Other workers changed the catalog too; replay everything in order
+                cls._checked_at = 0.0
+
+    @classmethod
+    def update_object(cls, entity_type, object_id, label):
+        """Index a name once the current transaction commits"""
+        transaction.on_commit(lambda: cls._publish((entity_type, object_id, label)))
+
+    @classmethod
+    def remove_object(cls, entity_type, object_id):
+        transaction.on_commit(lambda: cls._publish((entity_type, object_id, None)))
@@ -0,0 +1,175 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from MallAPI.models.section_model import Section
+from MallAPI.models.store_model import (
+    Store, Product, Category, StoreDiscount, ProductRating
+)
+from MallAPI.models.search_model import SearchIndexEntry
+from MallAPI.models.Loyalty_models import GlobalLoyaltySetting
+from MallAPI.services.cache_services import CacheGenerationService
+from MallAPI.services.product_detail_services import ProductDetailService
+from MallAPI.services.search_index_services import SearchIndexService
+from MallAPI.services.suggest_services import SuggestionService
+from MallAPI.services.loyalty_services import LoyaltySettingsCache
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_caches(sender, **kwargs):
+    CacheGenerationService.bump_on_commit('products')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_caches(sender, **kwargs):
+    CacheGenerationService.bump_on_commit('categories')
+
+
+# Store listings are searched by category and section names too
+@receiver([post_save, post_delete], sender=Store)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Section)
+@receiver(m2m_changed, sender=Store.categories.through)
+def invalidate_store_caches(sender, **kwargs):
+    CacheGenerationService.bump_on_commit('stores')
+
+
+# --- Product detail payloads ---
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_detail(sender, instance, **kwargs):
+    CacheGenerationService.bump_on_commit(ProductDetailService.product_namespace(instance.id))
+
+
+# The average rating is part of the shared payload
+@receiver([post_save, post_delete], sender=ProductRating)
+def invalidate_rated_product_detail(sender, instance, **kwargs):
+    CacheGenerationService.bump_on_commit(ProductDetailService.product_namespace(instance.product_id))
+
+
+@receiver([post_save, post_delete], sender=Store)
+def invalidate_store_product_details(sender, instance, **kwargs):
+    CacheGenerationService.bump_on_commit(ProductDetailService.store_namespace(instance.id))
+
+
+@receiver([post_save, post_delete], sender=StoreDiscount)
+def invalidate_discounted_product_details(sender, instance, **kwargs):
+    CacheGenerationService.bump_on_commit(ProductDetailService.store_namespace(instance.store_id))
+
+
+@receiver(m2m_changed, sender=Store.categories.through)
+def invalidate_store_category_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        store_ids = [instance.id]
+    elif action == 'post_clear':
+        store_ids = getattr(instance, '_cleared_store_ids', [])
+    else:
+        store_ids = pk_set
+    for store_id in store_ids:
+        CacheGenerationService.bump_on_commit(ProductDetailService.store_namespace(store_id))
+
+
+# --- Search index maintenance ---
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    SearchIndexService.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    SearchIndexService.remove_object(SearchIndexEntry.PRODUCT, instance.id)
+
+
+@receiver(post_save, sender=Store)
+def index_store(sender, instance, **kwargs):
+    SearchIndexService.index_store(instance)
+
+
+@receiver(post_delete, sender=Store)
+def unindex_store(sender, instance, **kwargs):
+    SearchIndexService.remove_object(SearchIndexEntry.STORE, instance.id)
+
+
+def _reindex_stores(stores):
+    for store in stores.select_related('section').prefetch_related('categories'):
+        SearchIndexService.index_store(store)
+
+
+@receiver(m2m_changed, sender=Store.categories.through)
+def reindex_store_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            SearchIndexService.index_store(instance)
+        return
+
+    # Changed from the category side: reindex the affected stores. A clear
+    # has no pk_set, so remember the stores before the rows go away
+    if action == 'pre_clear':
+        instance._cleared_store_ids = list(instance.stores.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        _reindex_stores(Store.objects.filter(id__in=pk_set))
+    elif action == 'post_clear':
+        _reindex_stores(Store.objects.filter(id__in=getattr(instance, '_cleared_store_ids', [])))
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    SearchIndexService.index_category(instance)
+    # Stores carry their category names in their own entries
+    _reindex_stores(instance.stores.all())
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_stores(sender, instance, **kwargs):
+    instance._deleted_store_ids = list(instance.stores.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    SearchIndexService.remove_object(SearchIndexEntry.CATEGORY, instance.id)
+    _reindex_stores(Store.objects.filter(id__in=getattr(instance, '_deleted_store_ids', [])))
+
+
+@receiver(post_save, sender=Section)
+def reindex_section_stores(sender, instance, **kwargs):
+    _reindex_stores(instance.stores.all())
+
+
+# --- Type-ahead suggestions ---
+
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, **kwargs):
+    if instance.is_active:
+        SuggestionService.update_object(SearchIndexEntry.PRODUCT, instance.id, instance.name)
+    else:
+        SuggestionService.remove_object(SearchIndexEntry.PRODUCT, instance.id)
+
+
+@receiver(post_save, sender=Store)
+def update_store_suggestion(sender, instance, **kwargs):
+    SuggestionService.update_object(SearchIndexEntry.STORE, instance.id, instance.name)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, **kwargs):
+    SuggestionService.update_object(SearchIndexEntry.CATEGORY, instance.id, instance.name)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Store)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    entity_type = {
+        Product: SearchIndexEntry.PRODUCT,
+        Store: SearchIndexEntry.STORE,
+        Category: SearchIndexEntry.CATEGORY,
+    }[sender]
+    SuggestionService.remove_object(entity_type, instance.id)
+
+
+# --- Loyalty settings ---
+
+@receiver([post_save, post_delete], sender=GlobalLoyaltySetting)
+def invalidate_loyalty_settings(sender, **kwargs):
+    LoyaltySettingsCache.invalidate_on_commit()
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from MallAPI.models.Loyalty_models import Diamond, Prize, UserPoints
+from MallAPI.models.section_model import Section
+from MallAPI.models.store_model import Category, Product, Store, StoreDiscount
+from MallAPI.models.user_model import User
+
+def create_catalog_fixture(product_count):
+    """A customer and three discounted stores with diamonds, sharing
+    `product_count` products round-robin; returns (customer, stores, products)"""
+    section = Section.objects.create(name='Main', is_default=True)
+    category = Category.objects.create(name='Phones')
+    owner = User.objects.create_user('owner@example.com', 'password', name='Owner', role='STORE_MANAGER')
+    customer = User.objects.create_user('customer@example.com', 'password', name='Customer', role='CUSTOMER')
+
+    stores = []
+    for index in range(3):
+        store = Store.objects.create(name=f'Store {index}', description='Store', owner=owner, section=section)
+        StoreDiscount.objects.create(store=store, percentage=Decimal('10.00'), is_active=True)
+        Diamond.objects.create(store=store, quantity=index + 1, points_value=5000)
+        stores.append(store)
+
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Phone {index}',
+            description='Phone',
+            price=Decimal('100.00') + index,
+            category=category,
+            store=stores[index % len(stores)]
+        )
+        for index in range(product_count)
+    ])
+    return customer, stores, products
+
+def create_points_fixture():
+    """A customer holding 100 points across two stores and a 60 point prize"""
+    section = Section.objects.create(name='Main', is_default=True)
+    owner = User.objects.create_user('owner@example.com', 'password', name='Owner', role='STORE_MANAGER')
+    customer = User.objects.create_user('customer@example.com', 'password', name='Customer', role='CUSTOMER')
+    prize_store = Store.objects.create(name='Prize store', description='Store', owner=owner, section=section)
+    other_store = Store.objects.create(name='Other store', description='Store', owner=owner, section=section)
+    UserPoints.objects.create(user=customer, store=prize_store, points=30)
+    UserPoints.objects.create(user=customer, store=other_store, points=70)
+    prize = Prize.objects.create(name='Voucher', points_required=60, store=prize_store)
+    return customer, prize_store, other_store, prize
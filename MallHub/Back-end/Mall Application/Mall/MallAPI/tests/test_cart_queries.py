@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from MallAPI.models.cart_model import CartItem
+from MallAPI.services.cart_services import CartService
+from MallAPI.tests.fixtures import create_catalog_fixture
+
+class CartQueryCountTests(TestCase):
+    """Cart reads must cost the same number of queries at any cart size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, _, cls.products = create_catalog_fixture(15)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.cart = CartService.get_or_create_active_cart(self.customer)
+
+    def fill_cart(self, products):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2) for product in products
+        ])
+
+    def get_query_count(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.fill_cart(self.products[:2])
+        # Warm process-level caches (e.g. loyalty settings) before measuring
+        self.client.get(url)
+        small_cart = self.get_query_count(url)
+        self.fill_cart(self.products[2:])
+        large_cart = self.get_query_count(url)
+        self.assertEqual(small_cart, large_cart)
+        return large_cart
+
+    def test_cart_query_count_is_constant(self):
+        self.assertEqual(self.assert_constant_queries('/api/cart/'), 2)
+
+    def test_cart_bill_query_count_is_constant(self):
+        self.assert_constant_queries('/api/cart/bill/')
+
+    def test_payment_preview_query_count_is_constant(self):
+        self.assert_constant_queries('/api/payment/preview/')
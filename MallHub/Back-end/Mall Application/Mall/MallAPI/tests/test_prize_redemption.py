@@ -0,0 +1,72 @@
+import threading
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from MallAPI.models.Loyalty_models import PrizeRedemption, UserPoints
+from MallAPI.services.loyalty_services import LoyaltyService
+from MallAPI.tests.fixtures import create_points_fixture
+
+class PrizeRedemptionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.prize_store, cls.other_store, cls.prize = create_points_fixture()
+
+    def get_points(self, store):
+        return UserPoints.objects.get(user=self.customer, store=store).points
+
+    def test_prize_store_points_are_spent_first(self):
+        LoyaltyService.redeem_prize(self.customer.id, self.prize.id)
+
+        self.assertEqual(self.get_points(self.prize_store), 0)
+        self.assertEqual(self.get_points(self.other_store), 40)
+
+    def test_insufficient_points_change_nothing(self):
+        LoyaltyService.redeem_prize(self.customer.id, self.prize.id)
+
+        with self.assertRaisesMessage(ValueError, "Insufficient total points"):
+            LoyaltyService.redeem_prize(self.customer.id, self.prize.id)
+        self.assertEqual(self.get_points(self.prize_store), 0)
+        self.assertEqual(self.get_points(self.other_store), 40)
+        self.assertEqual(PrizeRedemption.objects.filter(user=self.customer).count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentPrizeRedemptionTests(TransactionTestCase):
+    """Redemptions racing for the same balance must not both spend it"""
+
+    def setUp(self):
+        self.customer, self.prize_store, self.other_store, self.prize = create_points_fixture()
+
+    def redeem_concurrently(self, attempts):
+        barrier = threading.Barrier(attempts)
+        results = []
+        lock = threading.Lock()
+
+        def redeem():
+            try:
+                barrier.wait()
+                LoyaltyService.redeem_prize(self.customer.id, self.prize.id)
+                outcome = 'redeemed'
+            except Exception as e:
+                outcome = str(e)
+            finally:
+                connection.close()
+            with lock:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=redeem) for _ in range(attempts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_balance_is_spent_only_once(self):
+        results = self.redeem_concurrently(2)
+
+        # The loser waits for the winner's row locks, then sees the new balance
+        self.assertEqual(sorted(results), ['Insufficient total points for redemption', 'redeemed'])
+        self.assertEqual(PrizeRedemption.objects.filter(user=self.customer).count(), 1)
+        balances = list(UserPoints.objects.filter(user=self.customer).values_list('points', flat=True))
+        self.assertTrue(all(points >= 0 for points in balances))
+        self.assertEqual(sum(balances), 40)
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from MallAPI.models.store_model import Favorite, Product
+from MallAPI.tests.fixtures import create_catalog_fixture
+
+class ProductListingQueryCountTests(TestCase):
+    """Product listings must cost the same number of queries at any page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.stores, _ = create_catalog_fixture(30)
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.customer, product=product) for product in Product.objects.all()[:12]
+        ])
+
+    def setUp(self):
+        # Page counts are cached; every measurement starts cold
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def get_query_count(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_all_products_query_count_is_constant(self):
+        small_page = self.get_query_count('/api/store/products/all/', {'per_page': 2})
+        large_page = self.get_query_count('/api/store/products/all/', {'per_page': 25})
+        self.assertEqual(small_page, large_page)
+
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get('/api/store/products/all/', {'per_page': 25})
+
+    def test_store_products_query_count_is_constant(self):
+        url = f'/api/store/stores/{self.stores[0].id}/products/paginated/'
+        small_page = self.get_query_count(url, {'page_size': 2})
+        large_page = self.get_query_count(url, {'page_size': 10})
+        self.assertEqual(small_page, large_page)
+
+    def test_favorites_query_count_is_constant(self):
+        few = self.get_query_count('/api/store/favorites/', {})
+        Favorite.objects.bulk_create([
+            Favorite(user=self.customer, product=product) for product in Product.objects.all()[12:30]
+        ])
+        many = self.get_query_count('/api/store/favorites/', {})
+        self.assertEqual(few, many)
@@ -1,8 +1,9 @@
 from django.urls import path
-from MallAPI.views.cart_views import CartView, CartBillView
+from MallAPI.views.cart_views import CartView, CartBillView, CartDeltaView
 
 urlpatterns = [
     # Base cart operations
     path('', CartView.as_view(), name='cart'),  # GET (view cart), POST (add to cart), DELETE (remove/clear)
     path('bill/', CartBillView.as_view(), name='cart-bill'),  # GET (view cart bill)
+    path('deltas/', CartDeltaView.as_view(), name='cart-deltas'),  # POST (apply quantity deltas or add/subtract/set/remove operations in one transaction)
 ]
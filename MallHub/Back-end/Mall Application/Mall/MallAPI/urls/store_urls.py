@@ -14,7 +14,8 @@ from MallAPI.views.store_views import (
     ProductRatingDeleteView,
     FavoriteListView,
     FavoriteAddRemoveView,
-    StoreDiscountView
+    StoreDiscountView,
+    SearchSuggestView
 )
 
 urlpatterns = [
@@ -72,6 +73,7 @@ urlpatterns = [
 
     # Other URLs
     path('search/', SearchView.as_view(), name='search'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search_suggest'),
     path('stores-paginated/', StoresPaginatedView.as_view(), name='stores_paginated'),
     path('products/all/', AllProductsView.as_view(), name='all-products'),
 ]
@@ -1,3 +1,11 @@
+from functools import wraps
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+import logging
+
+logger = logging.getLogger(__name__)
+
 def format_error_message(message):
     """Standardize error message format"""
     if isinstance(message, dict):
@@ -6,4 +14,48 @@ def format_error_message(message):
             if isinstance(errors, list):
                 return {"Details": errors[0]}
             return {"Details": str(errors)}
-    return {"Details": str(message)} 
\ No newline at end of file
+    return {"Details": str(message)}
+
+def conditional_get(get_validators, per_user=False):
+    """ETag / Last-Modified support for an APIView GET method.
+
+    `get_validators(request, *args, **kwargs)` returns (etag, last_modified)
+    with either one possibly None; it runs after authentication and
+    permission checks and should be much cheaper than building the
+    response. A matching If-None-Match / If-Modified-Since gets a 304
+    without calling the view. Set `per_user` when the validators depend on
+    request.user so shared caches keep responses apart.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            try:
+                etag, last_modified = get_validators(request, *args, **kwargs)
+            except ObjectDoesNotExist:
+                # Let the view produce its own 404
+                return method(view, request, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error computing validators for {view.__class__.__name__}: {str(e)}")
+                return method(view, request, *args, **kwargs)
+
+            etag = quote_etag(etag) if etag else None
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            if etag and not response.has_header('ETag'):
+                response.headers['ETag'] = etag
+            if timestamp is not None and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(timestamp)
+            # Always revalidate instead of serving a possibly stale copy
+            patch_cache_control(response, no_cache=True)
+            if per_user:
+                patch_cache_control(response, private=True)
+                patch_vary_headers(response, ('Authorization', 'Cookie'))
+            return response
+        return wrapper
+    return decorator
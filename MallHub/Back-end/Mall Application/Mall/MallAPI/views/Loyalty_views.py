@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from MallAPI.permissions import IsAdmin, IsNormalUser
 from MallAPI.services.loyalty_services import LoyaltyService
+from MallAPI.services.idempotency_services import idempotent
 from MallAPI.models.Loyalty_models import Prize, GlobalLoyaltySetting
 from MallAPI.serializers.Loyalty_Serializers import (
     DiamondSerializer,
@@ -233,6 +234,7 @@ class CustomerPrizeView(APIView):
         except Exception as e:
             return Response(format_error_message(str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @idempotent('prize_redemption')
     def post(self, request):
         """Redeem a prize"""
         try:
@@ -1,3 +1,4 @@
+from django.http import Http404
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -120,6 +121,34 @@ class CartView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class CartDeltaView(APIView):
+    permission_classes = [IsAuthenticated, IsNormalUser]
+
+    def post(self, request):
+        """Apply a list of quantity deltas or add / subtract / set / remove
+        operations to the cart in one transaction"""
+        try:
+            operations = request.data.get('operations')
+            deltas = request.data.get('deltas')
+            if operations:
+                cart = CartService.apply_batch_operations(request.user, operations)
+            elif deltas:
+                cart = CartService.apply_quantity_deltas(request.user, deltas)
+            else:
+                return Response(format_error_message("Deltas or operations are required"), status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = ShoppingCartSerializer(cart, context={'request': request})
+            return Response({
+                "message": "Cart updated successfully",
+                "cart": serializer.data
+            })
+        except Http404 as e:
+            return Response(format_error_message(str(e)), status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response(format_error_message(str(e)), status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(format_error_message(str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class CartBillView(APIView):
     permission_classes = [IsAuthenticated, IsNormalUser]
 
@@ -4,11 +4,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from MallAPI.permissions import IsNormalUser
 from MallAPI.models.cart_model import ShoppingCart
-from MallAPI.services.payment_services import PayFlexService
+from MallAPI.services.checkout_services import CheckoutService
+from MallAPI.services.idempotency_services import idempotent
 from MallAPI.serializers.payment_serializers import PaymentSerializer, CardDetailsSerializer, PaymentCreateSerializer
 from MallAPI.models.payment_model import Payment
 from MallAPI.models.delivery_model import DeliveryOrder
-from MallAPI.services.cart_services import CartService 
+from MallAPI.models.outbox_model import OutboxEvent
+from MallAPI.services.outbox_services import OutboxService
+from MallAPI.services.cart_services import CartService, CartPricingEngine
 from MallAPI.services.loyalty_services import LoyaltyService
 from MallAPI.utils import format_error_message
 import stripe
@@ -19,9 +22,19 @@ from MallAPI.serializers.delivery_serializers import DeliveryOrderSerializer
 if hasattr(settings, 'STRIPE_SECRET_KEY'):
     stripe.api_key = settings.STRIPE_SECRET_KEY
 
+def _payment_fingerprint(data):
+    # The card number, expiry and CVV are never stored, not even hashed;
+    # the last four digits are enough to tell a retry from another card
+    card_number = str(data.get('card_number') or '')
+    return {
+        'discount_code': data.get('discount_code'),
+        'card_last4': card_number[-4:]
+    }
+
 class PaymentProcessView(APIView):
     permission_classes = [IsAuthenticated, IsNormalUser]
     
+    @idempotent('payment_process', fingerprint=_payment_fingerprint)
     def post(self, request):
         """Process payment with PayFlex"""
         # Extract discount code if provided
@@ -32,43 +45,16 @@ class PaymentProcessView(APIView):
             return Response(format_error_message("Invalid card details"), status=status.HTTP_400_BAD_REQUEST)
             
         try:
-            # Get active cart
-            cart = CartService.get_or_create_active_cart(request.user)
-            
-            # Check if cart is empty
-            if cart.items.count() == 0:
-                return Response(format_error_message("Cart is empty"), status=status.HTTP_400_BAD_REQUEST)
-            
-            # Calculate points to be earned before payment
-            points_preview = LoyaltyService.calculate_purchase_points(cart.id)
-            
-            # Determine final amount: Apply discount if code is valid
-            final_amount = CartService.get_cart_total(cart)
-            discount_details = None
-            if discount_code:
-                try:
-                    # Validate discount code again and get final amount
-                    discount_result = LoyaltyService.apply_discount_code(discount_code, cart.id)
-                    final_amount = discount_result['final_amount']
-                    discount_details = discount_result # Store details for response
-                    print(f"Discount {discount_code} applied. Final amount: {final_amount}")
-                except ValueError as e:
-                    # Handle invalid/used discount code applied at checkout stage
-                    print(f"Discount code {discount_code} invalid at payment: {e}")
-                    return Response(format_error_message(f"Discount code error: {e}"), status=status.HTTP_400_BAD_REQUEST)
-                except Exception as e:
-                    print(f"Error validating discount during payment: {e}")
-                    return Response(format_error_message("Error processing discount during payment."), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            payment = PayFlexService.process_payment(
+            # Pricing, points, payment, delivery and cart rollover in one
+            # transaction; the response is built from the same snapshot
+            result = CheckoutService.checkout(
                 user=request.user,
-                cart=cart,
-                amount=final_amount, # Pass the final amount
-                card_details=card_serializer.validated_data
+                card_details=card_serializer.validated_data,
+                discount_code=discount_code
             )
-            
-            # Create new cart for future use
-            CartService.get_or_create_active_cart(request.user)
+            payment = result.payment
+            breakdown = result.breakdown
+            points_preview = result.points_preview
             
             return Response({
                 "status": "success",
@@ -80,13 +66,13 @@ class PaymentProcessView(APIView):
                     "timestamp": payment.created_at
                 },
                 "cart_details": {
-                    "total_items": cart.items.count(),
+                    "total_items": breakdown.item_count,
                     "items": [{
-                        "product_name": item.product.name,
-                        "quantity": item.quantity,
-                        "price": str(item.product.price),
-                        "subtotal": str(item.product.price * item.quantity)
-                    } for item in cart.items.all()],
+                        "product_name": line.product.name,
+                        "quantity": line.quantity,
+                        "price": str(line.unit_price),
+                        "subtotal": str(line.unit_price * line.quantity)
+                    } for line in breakdown.lines],
                     "total_amount": str(payment.amount)
                 },
                 "loyalty_points": {
@@ -95,7 +81,7 @@ class PaymentProcessView(APIView):
                     "breakdown": points_preview.get('breakdown', [])
                 },
                 # Optionally include discount info in the response
-                "discount_info": discount_details if discount_details else "No discount applied"
+                "discount_info": result.discount_details if result.discount_details else "No discount applied"
             }, status=status.HTTP_200_OK)
             
         except ValueError as e:
@@ -128,6 +114,16 @@ class OrderStatusView(APIView):
                 })
                 
             except DeliveryOrder.DoesNotExist:
+                # The process_outbox worker creates the delivery order shortly after payment
+                if OutboxService.is_payment_event_pending(OutboxEvent.ASSIGN_DELIVERY, payment.id):
+                    return Response({
+                        'status': 'success',
+                        'order_status': {
+                            'status': 'PROCESSING',
+                            'payment_id': payment.payment_id,
+                            'total_amount': str(payment.amount)
+                        }
+                    }, status=status.HTTP_202_ACCEPTED)
                 return Response(format_error_message('Payment found but no delivery order created. Please contact support.'), status=status.HTTP_404_NOT_FOUND)
                 
         except Payment.DoesNotExist:
@@ -144,43 +140,45 @@ class PaymentPreviewView(APIView):
             # Get active cart
             cart = CartService.get_or_create_active_cart(request.user)
             
+            # Price the cart once and build the whole preview from the breakdown
+            breakdown = CartPricingEngine.price_cart(cart)
+            
             # Check if cart is empty
-            if cart.items.count() == 0:
+            if breakdown.is_empty:
                 return Response(format_error_message("Cart is empty"), status=status.HTTP_400_BAD_REQUEST)
             
             # Calculate cart total
-            cart_total = CartService.get_cart_total(cart)
+            cart_total = breakdown.total
             
-            # Calculate potential loyalty points
-            points_preview = LoyaltyService.calculate_purchase_points(cart.id)
+            # Per-store diamonds and potential loyalty points in one grouped query
+            store_rows = list(LoyaltyService.get_cart_store_diamonds(cart))
+            points_preview = LoyaltyService.summarize_store_points(store_rows)
+            diamonds_by_store = {row['product__store_id']: row['diamond_count'] for row in store_rows}
             
             # Get cart items with store information
             cart_items = []
             store_diamonds = {}
             
-            for item in cart.items.all():
-                store = item.product.store
+            for line in breakdown.lines:
+                store = line.store
                 if store.id not in store_diamonds:
-                    # Get diamond quantity for this store
-                    diamond = store.diamonds.first()
-                    diamond_quantity = diamond.quantity if diamond else 0
                     store_diamonds[store.id] = {
                         "store_name": store.name,
-                        "diamonds": diamond_quantity
+                        "diamonds": diamonds_by_store.get(store.id, 0)
                     }
                 
                 cart_items.append({
-                    "product_name": item.product.name,
-                    "quantity": item.quantity,
-                    "price": str(item.product.price),
-                    "subtotal": str(item.product.price * item.quantity),
+                    "product_name": line.product.name,
+                    "quantity": line.quantity,
+                    "price": str(line.unit_price),
+                    "subtotal": str(line.unit_price * line.quantity),
                     "store_name": store.name,
                     "store_id": store.id
                 })
             
             return Response({
                 "cart_details": {
-                    "total_items": cart.items.count(),
+                    "total_items": breakdown.item_count,
                     "items": cart_items,
                     "total_amount": str(cart_total)
                 },
@@ -205,8 +203,9 @@ class PaymentPreviewView(APIView):
             # Get active cart
             cart = CartService.get_or_create_active_cart(request.user)
             
-            # Apply discount code
-            discount_result = LoyaltyService.apply_discount_code(discount_code, cart.id)
+            # Apply discount code to the cart priced once here
+            breakdown = CartPricingEngine.price_cart(cart)
+            discount_result = LoyaltyService.apply_discount_code(discount_code, cart.id, breakdown=breakdown)
             
             return Response({
                 "discount_applied": True,
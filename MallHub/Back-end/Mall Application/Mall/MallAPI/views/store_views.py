@@ -4,7 +4,13 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from MallAPI.serializers.store_serializers import StoreSerializer, ProductCreateSerializer, StoreCreateSerializer, CategorySerializer, ProductSerializer,SectionSerializer, ProductListSerializer, StoreBasicSerializer, StorePaginatedSerializer, ProductWithStoreSerializer, ProductCommentSerializer, ProductInteractionSerializer, CommentInteractionSerializer, ProductRatingSerializer, FavoriteSerializer, StoreDiscountSerializer
 from MallAPI.models.store_model import Store, Category, Product,Section, ProductComment, ProductInteraction, CommentInteraction, ProductRating, Favorite, StoreDiscount
-from MallAPI.services.store_services import StoreService, SearchService
+from MallAPI.services.store_services import StoreService, SearchService, CommentService
+from MallAPI.services.search_index_services import SearchIndexService
+from MallAPI.services.suggest_services import SuggestionService
+from MallAPI.services.product_stats_services import ProductStatsService
+from MallAPI.services.product_detail_services import ProductDetailService
+from MallAPI.services.catalog_version_services import CatalogVersionService
+from MallAPI.models.search_model import SearchIndexEntry
 from rest_framework import generics
 from rest_framework.exceptions import PermissionDenied, NotFound
 from django.shortcuts import get_object_or_404
@@ -15,8 +21,10 @@ from MallAPI.services.store_services import SearchService
 import logging
 from django.core.paginator import Paginator, EmptyPage
 from MallAPI.permissions import IsAdminOrStoreManagerOrNormalUser
-from MallAPI.utils import format_error_message
-from django.db.models import Q, Count, Avg
+from MallAPI.utils import format_error_message, conditional_get
+from MallAPI.pagination import KeysetPaginator, InvalidCursor, CachedCountPaginator
+from django.db import transaction
+from django.db.models import Prefetch
 logger = logging.getLogger(__name__)
 
 # Add a new view for store-wide discounts
@@ -104,6 +112,7 @@ class StoreDiscountView(APIView):
 class StoreListView(APIView):
     permission_classes = [IsAuthenticated, IsStoreManagerOrNormalUser]
 
+    @conditional_get(CatalogVersionService.store_list)
     def get(self, request):
         """Get all stores with their IDs and names"""
         try:
@@ -339,6 +348,34 @@ class CategoryView(APIView):
         except Exception as e:
             return Response(format_error_message(str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class SearchSuggestView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Type-ahead suggestions for product, store and category names"""
+        try:
+            query = request.query_params.get('q', '')
+            limit = int(request.query_params.get('limit', SuggestionService.MAX_RESULTS))
+            entity_type = request.query_params.get('type')
+
+            if entity_type and entity_type not in SuggestionService.ENTITY_TYPES:
+                return Response(
+                    format_error_message('Invalid type. Use "product", "store" or "category"'),
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            return Response({
+                'status': 'success',
+                'query': query,
+                'suggestions': SuggestionService.suggest(query, limit, entity_type)
+            }, status=status.HTTP_200_OK)
+
+        except ValueError:
+            return Response(format_error_message('Invalid limit parameter'), status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Suggestion error: {str(e)}")
+            return Response(format_error_message('An error occurred while fetching suggestions'), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class SearchView(APIView):
     permission_classes = [IsAuthenticated, IsNormalUser]
     parser_classes = (JSONParser,)
@@ -664,6 +701,7 @@ class StoreProductsView(APIView):
 class AllCategoriesView(APIView):
     permission_classes = [AllowAny]  # Adjust based on your requirements
 
+    @conditional_get(CatalogVersionService.category_list)
     def get(self, request):
         """Get all categories without pagination"""
         try:
@@ -748,6 +786,7 @@ class ProductDeleteView(APIView):
 class StoreDetailView(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_get(CatalogVersionService.store_detail)
     def get(self, request, store_id):
         """Get store details by ID"""
         try:
@@ -781,40 +820,20 @@ class StoreDetailView(APIView):
 class ProductDetailView(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_get(CatalogVersionService.product_detail, per_user=True)
     def get(self, request, product_id):
         """Get product details by ID, including average rating and user's rating."""
         try:
-            # Annotate product with average rating
-            product = Product.objects.select_related('store', 'category') \
-                                     .annotate(average_rating=Avg('ratings__rating')) \
-                                     .get(id=product_id)
-
-            # Get current user's rating for this product, if authenticated
-            user_rating = None
-            if request.user.is_authenticated and request.user.role == 'CUSTOMER': # Only customers can rate
-                try:
-                    rating_obj = ProductRating.objects.get(product=product, user=request.user)
-                    user_rating = rating_obj.rating
-                except ProductRating.DoesNotExist:
-                    pass # User hasn't rated this product
-
-            # Prepare context for the serializer
-            context = {
-                'request': request,
-                'average_rating': product.average_rating, # Pass the calculated average
-                'user_rating': user_rating # Pass the user's rating (or None)
-            }
+            # Shared part comes from the per-product cache, the user's own
+            # rating / favorite / interaction from one small query
+            entry = ProductDetailService.get_shared_payload(product_id, request)
+            user_fields = ProductDetailService.get_request_user_fields(request, product_id)
 
-            serializer = ProductListSerializer(product, context=context)
-
-            # Manually add store info as ProductListSerializer doesn't include it
             response_data = {
-                **serializer.data,
-                "store": {
-                    'id': product.store.id,
-                    'name': product.store.name
-                } if product.store else None,
-                "category_id": product.category.id if product.category else None
+                **entry['product'],
+                **user_fields,
+                "store": entry['store'],
+                "category_id": entry['category_id']
             }
 
             return Response({
@@ -847,6 +866,22 @@ class StoresByCategoryView(APIView):
             # Get stores for this category
             stores = Store.objects.filter(categories=category).distinct()
             
+            # Cursor mode: seek past the previous page instead of counting and offsetting
+            if 'cursor' in request.query_params:
+                cursor_page = KeysetPaginator(stores, ('name', 'id'), per_page).page(
+                    request.query_params.get('cursor')
+                )
+                serializer = StoreSerializer(cursor_page.object_list, many=True, context={'request': request})
+                return Response({
+                    "status": "success",
+                    "category": {
+                        "id": category.id,
+                        "name": category.name
+                    },
+                    "pagination": cursor_page.pagination_data(),
+                    "stores": serializer.data
+                }, status=status.HTTP_200_OK)
+            
             # Apply pagination
             paginator = Paginator(stores, per_page)
             
@@ -880,6 +915,10 @@ class StoresByCategoryView(APIView):
             return Response({
                 "Details": "Category not found"
             }, status=status.HTTP_404_NOT_FOUND)
+        except InvalidCursor:
+            return Response({
+                "Details": "Invalid cursor"
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error getting stores by category: {str(e)}")
             return Response({
@@ -892,22 +931,19 @@ class StoreProductDetailView(APIView):
     def get(self, request, store_id, product_id):
         """Get specific product from specific store"""
         try:
-            # Get product that belongs to the specified store
-            product = get_object_or_404(
-                Product.objects.select_related('store', 'category'),
-                id=product_id,
-                store_id=store_id
-            )
-            
-            serializer = ProductListSerializer(product, context={'request': request})
-            
+            entry = ProductDetailService.get_shared_payload(product_id, request)
+            # Product must belong to the specified store
+            if entry['store_id'] != store_id:
+                raise Product.DoesNotExist
+            user_fields = ProductDetailService.get_user_fields(request.user, product_id)
+
             return Response({
                 "status": "success",
-                "store": {
-                    "id": product.store.id,
-                    "name": product.store.name
-                },
-                "product": serializer.data
+                "store": entry['store'],
+                "product": {
+                    **entry['product'],
+                    **user_fields
+                }
             }, status=status.HTTP_200_OK)
             
         except Product.DoesNotExist:
@@ -940,15 +976,41 @@ class StoresPaginatedView(APIView):
             
             # Apply search filter if query parameter exists
             if search_query:
-                stores = stores.filter(
-                    Q(name__icontains=search_query) |
-                    Q(description__icontains=search_query) |
-                    Q(categories__name__icontains=search_query) |  # Search in category names
-                    Q(section__name__icontains=search_query)  # Search in section names
-                ).distinct()  # Use distinct to avoid duplicate stores
-            
-            # Apply pagination
-            paginator = Paginator(stores, per_page)
+                # The store index also covers its category and section names
+                stores = SearchIndexService.apply_search(
+                    stores, SearchIndexEntry.STORE, search_query
+                ).order_by('-search_rank', 'name')
+            
+            # Cursor mode: seek past the previous page instead of counting and offsetting
+            if 'cursor' in request.query_params:
+                cursor_page = KeysetPaginator(stores, ('name', 'id'), per_page).page(
+                    request.query_params.get('cursor')
+                )
+                serializer = StorePaginatedSerializer(
+                    cursor_page.object_list,
+                    many=True,
+                    context={'request': request}
+                )
+                response_data = {
+                    "status": "success",
+                    "stores": {
+                        "items": serializer.data,
+                        **cursor_page.pagination_data()
+                    }
+                }
+                if search_query:
+                    response_data['search_query'] = search_query
+                return Response(response_data, status=status.HTTP_200_OK)
+            
+            # Apply pagination, reusing a cached total for the same search. Unfiltered
+            # listings may opt into the database's row estimate with estimate_count=true
+            paginator = CachedCountPaginator(
+                stores,
+                per_page,
+                namespace='stores',
+                filters={'listing': 'all_stores', 'q': search_query},
+                allow_estimate=request.query_params.get('estimate_count', 'false').lower() == 'true'
+            )
             
             try:
                 paginated_stores = paginator.page(page)
@@ -974,7 +1036,8 @@ class StoresPaginatedView(APIView):
                         "current_page": page,
                         "per_page": per_page,
                         "has_next": paginated_stores.has_next(),
-                        "has_previous": paginated_stores.has_previous()
+                        "has_previous": paginated_stores.has_previous(),
+                        "total_is_approximate": paginator.total_is_approximate
                     }
                 }
             except Exception as e:
@@ -989,6 +1052,11 @@ class StoresPaginatedView(APIView):
             
             return Response(response_data, status=status.HTTP_200_OK)
             
+        except InvalidCursor:
+            return Response({
+                "status": "error",
+                "message": "Invalid cursor"
+            }, status=status.HTTP_400_BAD_REQUEST)
         except ValueError:
             return Response({
                 "status": "error",
@@ -1006,6 +1074,7 @@ class StoresPaginatedView(APIView):
 class AllSectionsView(APIView):
     permission_classes = [IsAuthenticated, IsAdminOrStoreManagerOrNormalUser]  # Updated permissions
 
+    @conditional_get(CatalogVersionService.section_list, per_user=True)
     def get(self, request):
         """Get all sections with pagination"""
         try:
@@ -1071,13 +1140,41 @@ class AllProductsView(APIView):
             
             # Apply search filter if query parameter exists
             if search_query:
-                products = products.filter(
-                    Q(name__icontains=search_query) |
-                    Q(description__icontains=search_query)
-                )
+                products = SearchIndexService.apply_search(
+                    products, SearchIndexEntry.PRODUCT, search_query
+                ).order_by('-search_rank', '-created_at')
             
-            # Apply pagination
-            paginator = Paginator(products, per_page)
+            # Annotate favorites, discounts and diamonds for the serializer
+            products = StoreService.annotate_product_listing(products, request)
+            
+            # Cursor mode: seek past the previous page instead of counting and offsetting
+            if 'cursor' in request.query_params:
+                cursor_page = KeysetPaginator(products, ('-created_at', '-id'), per_page).page(
+                    request.query_params.get('cursor')
+                )
+                serializer = ProductWithStoreSerializer(
+                    cursor_page.object_list,
+                    many=True,
+                    context={'request': request}
+                )
+                response_data = {
+                    'status': 'success',
+                    'products': {
+                        'items': serializer.data,
+                        **cursor_page.pagination_data()
+                    }
+                }
+                if search_query:
+                    response_data['search_query'] = search_query
+                return Response(response_data, status=status.HTTP_200_OK)
+            
+            # Apply pagination, reusing a cached total for the same search
+            paginator = CachedCountPaginator(
+                products,
+                per_page,
+                namespace='products',
+                filters={'listing': 'all_products', 'q': search_query}
+            )
             
             try:
                 paginated_products = paginator.page(page)
@@ -1101,7 +1198,8 @@ class AllProductsView(APIView):
                     'current_page': page,
                     'per_page': per_page,
                     'has_next': paginated_products.has_next(),
-                    'has_previous': paginated_products.has_previous()
+                    'has_previous': paginated_products.has_previous(),
+                    'total_is_approximate': paginator.total_is_approximate
                 }
             }
             
@@ -1111,6 +1209,10 @@ class AllProductsView(APIView):
             
             return Response(response_data, status=status.HTTP_200_OK)
                     
+        except InvalidCursor:
+            return Response({
+                'Details': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
         except ValueError:
             return Response({
                 'Details': 'Invalid page or per_page parameter'
@@ -1137,12 +1239,31 @@ class StorePaginatedProductsView(APIView):
             # Get all ACTIVE products for the store with search filter
             products = Product.objects.filter(store=store, is_active=True)
             if search_query:
-                products = products.filter(
-                    Q(name__icontains=search_query) |
-                    Q(description__icontains=search_query)
+                products = SearchIndexService.apply_search(
+                    products, SearchIndexEntry.PRODUCT, search_query
                 )
             products = products.order_by('id')
             
+            # Annotate favorites, discounts and diamonds for the serializer
+            products = StoreService.annotate_product_listing(products, request)
+            
+            # Cursor mode: seek past the previous page instead of counting and offsetting
+            if 'cursor' in request.query_params:
+                cursor_page = KeysetPaginator(products, ('id',), page_size).page(
+                    request.query_params.get('cursor')
+                )
+                serializer = ProductWithStoreSerializer(cursor_page.object_list, many=True, context={'request': request})
+                response_data = {
+                    'status': 'success',
+                    'products': {
+                        'items': serializer.data,
+                        **cursor_page.pagination_data()
+                    }
+                }
+                if search_query:
+                    response_data['search_query'] = search_query
+                return Response(response_data, status=status.HTTP_200_OK)
+            
             # Create paginator
             paginator = Paginator(products, page_size)
             
@@ -1173,6 +1294,11 @@ class StorePaginatedProductsView(APIView):
             
             return Response(response_data, status=status.HTTP_200_OK)
             
+        except InvalidCursor:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
         except ValueError:
             return Response({
                 'status': 'error',
@@ -1193,11 +1319,35 @@ class ProductCommentListCreateView(APIView):
     def get(self, request, product_id):
         """Get all top-level comments for a specific product with pagination."""
         product = get_object_or_404(Product, id=product_id)
-        page = int(request.query_params.get('page', 1))
-        per_page = int(request.query_params.get('per_page', 10))
+        try:
+            page = int(request.query_params.get('page', 1))
+            per_page = int(request.query_params.get('per_page', 10))
+        except ValueError:
+            return Response(format_error_message("Invalid page or per_page parameter"), status=status.HTTP_400_BAD_REQUEST)
+        if per_page < 1:
+            return Response(format_error_message("per_page must be at least 1"), status=status.HTTP_400_BAD_REQUEST)
 
         # Fetch only top-level comments (parent is None)
-        comments = ProductComment.objects.filter(product=product, parent__isnull=True).select_related('user').prefetch_related('replies')
+        comments = CommentService.annotate_comments(
+            ProductComment.objects.filter(product=product, parent__isnull=True), request.user
+        ).order_by('created_at', 'id')
+
+        # Cursor mode: seek past the previous page instead of counting and offsetting
+        if 'cursor' in request.query_params:
+            try:
+                cursor_page = KeysetPaginator(comments, ('created_at', 'id'), per_page).page(
+                    request.query_params.get('cursor')
+                )
+            except InvalidCursor as e:
+                return Response(format_error_message(e), status=status.HTTP_400_BAD_REQUEST)
+
+            page_comments = CommentService.load_reply_tree(cursor_page.object_list, request.user)
+            serializer = self.serializer_class(page_comments, many=True, context={'request': request})
+            return Response({
+                "status": "success",
+                "pagination": cursor_page.pagination_data(),
+                "comments": serializer.data
+            }, status=status.HTTP_200_OK)
 
         paginator = Paginator(comments, per_page)
         try:
@@ -1205,7 +1355,9 @@ class ProductCommentListCreateView(APIView):
         except EmptyPage:
             return Response(format_error_message("Page not found"), status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.serializer_class(paginated_comments, many=True, context={'request': request})
+        # Load every reply under this page's comments in one query per nesting level
+        page_comments = CommentService.load_reply_tree(paginated_comments, request.user)
+        serializer = self.serializer_class(page_comments, many=True, context={'request': request})
 
         return Response({
             "status": "success",
@@ -1237,7 +1389,9 @@ class ProductCommentListCreateView(APIView):
                 if parent_comment.product != product:
                     return Response(format_error_message("Cannot reply to a comment from a different product."), status=status.HTTP_400_BAD_REQUEST)
 
-            serializer.save(user=request.user, product=product)
+            with transaction.atomic():
+                serializer.save(user=request.user, product=product)
+                ProductStatsService.adjust(product.id, comments_count=1)
             return Response({"status": "success", "comment": serializer.data}, status=status.HTTP_201_CREATED)
         else:
             error_msg = next(iter(serializer.errors.values()))[0]
@@ -1261,6 +1415,7 @@ class ProductCommentDetailView(APIView):
         # Ensure comment belongs to the product in the URL
         if comment.product.id != product_id:
             raise NotFound(detail="Comment not found for this product")
+        CommentService.load_reply_tree([comment], request.user)
         serializer = self.serializer_class(comment, context={'request': request})
         return Response({"status": "success", "comment": serializer.data}, status=status.HTTP_200_OK)
 
@@ -1285,7 +1440,10 @@ class ProductCommentDetailView(APIView):
         comment = self.get_object(comment_id)
         if comment.product.id != product_id:
             raise NotFound(detail="Comment not found for this product")
-        comment.delete()
+        with transaction.atomic():
+            # Deleting a comment also deletes its replies
+            _, deleted = comment.delete()
+            ProductStatsService.adjust(product_id, comments_count=-deleted.get(ProductComment._meta.label, 0))
         return Response({"status": "success", "message": "Comment deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -1303,12 +1461,27 @@ class ProductInteractionView(APIView):
         if not interaction_type or interaction_type not in [ProductInteraction.LIKE, ProductInteraction.DISLIKE]:
             return Response(format_error_message(f"Invalid or missing interaction_type. Must be '{ProductInteraction.LIKE}' or '{ProductInteraction.DISLIKE}'."), status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if interaction already exists
-        interaction, created = ProductInteraction.objects.update_or_create(
-            user=request.user,
-            product=product,
-            defaults={'interaction_type': interaction_type}
-        )
+        with transaction.atomic():
+            # Check if interaction already exists, locking it so the stats move with it
+            interaction = ProductInteraction.objects.select_for_update().filter(
+                user=request.user, product=product
+            ).first()
+            created = interaction is None
+            previous_type = None if created else interaction.interaction_type
+
+            if created:
+                interaction = ProductInteraction.objects.create(
+                    user=request.user, product=product, interaction_type=interaction_type
+                )
+            elif previous_type != interaction_type:
+                interaction.interaction_type = interaction_type
+                interaction.save(update_fields=['interaction_type'])
+
+            if previous_type != interaction_type:
+                deltas = {ProductStatsService.INTERACTION_COUNTERS[interaction_type]: 1}
+                if previous_type:
+                    deltas[ProductStatsService.INTERACTION_COUNTERS[previous_type]] = -1
+                ProductStatsService.adjust(product.id, **deltas)
 
         serializer = self.serializer_class(interaction)
         status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
@@ -1320,8 +1493,12 @@ class ProductInteractionView(APIView):
         """Remove a like/dislike interaction (unlike/undislike)."""
         product = get_object_or_404(Product, id=product_id)
         try:
-            interaction = ProductInteraction.objects.get(user=request.user, product=product)
-            interaction.delete()
+            with transaction.atomic():
+                interaction = ProductInteraction.objects.select_for_update().get(user=request.user, product=product)
+                interaction.delete()
+                ProductStatsService.adjust(
+                    product.id, **{ProductStatsService.INTERACTION_COUNTERS[interaction.interaction_type]: -1}
+                )
             return Response({"status": "success", "message": "Interaction removed successfully"}, status=status.HTTP_204_NO_CONTENT)
         except ProductInteraction.DoesNotExist:
             return Response(format_error_message("No interaction found for this user and product."), status=status.HTTP_404_NOT_FOUND)
@@ -1331,13 +1508,10 @@ class ProductInteractionStatsView(APIView):
 
     def get(self, request, product_id):
         """Get like/dislike counts for a product."""
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.select_related('stats'), id=product_id)
 
-        # Efficiently count likes and dislikes
-        stats = product.interactions.aggregate(
-            likes_count=Count('id', filter=Q(interaction_type=ProductInteraction.LIKE)),
-            dislikes_count=Count('id', filter=Q(interaction_type=ProductInteraction.DISLIKE))
-        )
+        # Likes and dislikes come from the precomputed stats row
+        product_stats = ProductStatsService.get_stats(product)
 
         # Check current user's interaction
         user_interaction = None
@@ -1351,8 +1525,8 @@ class ProductInteractionStatsView(APIView):
         return Response({
             "status": "success",
             "product_id": product_id,
-            "likes_count": stats['likes_count'],
-            "dislikes_count": stats['dislikes_count'],
+            "likes_count": product_stats.likes_count,
+            "dislikes_count": product_stats.dislikes_count,
             "user_interaction": user_interaction # Indicates if the current user liked, disliked, or null
         }, status=status.HTTP_200_OK)
 
@@ -1402,12 +1576,20 @@ class ProductRatingSubmitView(APIView):
 
         if serializer.is_valid():
             rating_value = serializer.validated_data['rating']
-            # Use update_or_create to handle both creating and updating
-            rating_obj, created = ProductRating.objects.update_or_create(
-                user=request.user,
-                product=product,
-                defaults={'rating': rating_value}
-            )
+            with transaction.atomic():
+                # Lock any existing rating so the stats delta matches what is replaced
+                rating_obj = ProductRating.objects.select_for_update().filter(
+                    user=request.user, product=product
+                ).first()
+                created = rating_obj is None
+                if created:
+                    rating_obj = ProductRating.objects.create(user=request.user, product=product, rating=rating_value)
+                    ProductStatsService.adjust(product.id, rating_sum=rating_value, rating_count=1)
+                else:
+                    previous_rating = rating_obj.rating
+                    rating_obj.rating = rating_value
+                    rating_obj.save(update_fields=['rating', 'updated_at'])
+                    ProductStatsService.adjust(product.id, rating_sum=rating_value - previous_rating)
             status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
             message = "Rating submitted successfully" if created else "Rating updated successfully"
             # Return the updated object using the serializer
@@ -1427,8 +1609,10 @@ class ProductRatingDeleteView(APIView):
         """ Delete the user's rating for a product. """
         product = get_object_or_404(Product, id=product_id)
         try:
-            rating_obj = ProductRating.objects.get(user=request.user, product=product)
-            rating_obj.delete()
+            with transaction.atomic():
+                rating_obj = ProductRating.objects.select_for_update().get(user=request.user, product=product)
+                rating_obj.delete()
+                ProductStatsService.adjust(product.id, rating_sum=-rating_obj.rating, rating_count=-1)
             return Response({"status": "success", "message": "Rating deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         except ProductRating.DoesNotExist:
             return Response({"status": "error", "message": "You have not rated this product."}, status=status.HTTP_404_NOT_FOUND)
@@ -1445,8 +1629,11 @@ class FavoriteListView(generics.ListAPIView):
     def get_queryset(self):
         """ Return a list of all the favorite products for the current user. """
         user = self.request.user
-        # Eager load related product and its store for efficiency
-        return Favorite.objects.filter(user=user).select_related('product__store', 'product__category').order_by('-added_at')
+        # Load the favorited products annotated the same way as product listings
+        products = StoreService.annotate_product_listing(Product.objects.select_related('category'), self.request)
+        return Favorite.objects.filter(user=user).select_related('user').prefetch_related(
+            Prefetch('product', queryset=products)
+        ).order_by('-added_at')
 
 class FavoriteAddRemoveView(APIView):
     permission_classes = [IsAuthenticated, IsNormalUser] # Only customers can add/remove favorites
@@ -1457,7 +1644,10 @@ class FavoriteAddRemoveView(APIView):
         user = request.user
 
         # Use get_or_create to add only if it doesn't exist
-        favorite, created = Favorite.objects.get_or_create(user=user, product=product)
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(user=user, product=product)
+            if created:
+                ProductStatsService.adjust(product.id, favorites_count=1)
 
         if created:
             serializer = FavoriteSerializer(favorite, context={'request': request})
@@ -1471,8 +1661,10 @@ class FavoriteAddRemoveView(APIView):
         user = request.user
 
         try:
-            favorite = Favorite.objects.get(user=user, product=product)
-            favorite.delete()
+            with transaction.atomic():
+                favorite = Favorite.objects.select_for_update().get(user=user, product=product)
+                favorite.delete()
+                ProductStatsService.adjust(product.id, favorites_count=-1)
             return Response({"status": "success", "message": "Product removed from favorites."}, status=status.HTTP_204_NO_CONTENT)
         except Favorite.DoesNotExist:
             return Response({"status": "error", "message": "Product not found in favorites."}, status=status.HTTP_404_NOT_FOUND)